@@ -0,0 +1,88 @@
+#Return analytics over dates x assets panels for the black_litterman model
+
+import numpy as np
+
+
+def simple_returns(prices, out=None):
+    """
+    Period returns p[t+1] / p[t] - 1 of every asset at once
+
+    prices:         dates x assets matrix of prices (or one series), oldest first
+    out:            optional array of len(prices) - 1 rows to write into
+    output:         (dates - 1) x assets matrix of returns
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    out = np.divide(prices[1:], prices[:-1], out=out)
+    out -= 1
+    return out
+
+def log_returns(prices, out=None):
+    """
+    Period log returns log(p[t+1] / p[t]), see simple_returns
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    out = np.divide(prices[1:], prices[:-1], out=out)
+    return np.log(out, out=out)
+
+def daily_rate(rate, periods=250):
+    """
+    The per period rate that compounds to an annual rate
+
+    rate:           annual risk free rate
+    periods:        periods in a year, 250 as in blacklitterman.risk_free_rate
+    """
+    return (1 + rate) ** (1.0 / periods) - 1
+
+def excess_returns(returns, rate, periods=250, out=None):
+    """
+    Returns over the risk free rate, without touching the input (pass it as
+    out to subtract in place)
+
+    returns:        dates x assets matrix of period returns
+    rate:           annual risk free rate
+    periods:        periods in a year
+    out:            optional array shaped like returns to write into
+    output:         matrix of excess returns
+    """
+    return np.subtract(returns, daily_rate(rate, periods), out=out)
+
+def annual_mean(returns, periods=256, out=None):
+    """
+    Mean period return of each asset scaled to a year
+
+    returns:        dates x assets matrix of period returns
+    periods:        periods in a year, 256 as in stddev_matrix
+    out:            optional array of one value per asset to write into
+    output:         annual mean per asset
+    """
+    out = np.mean(returns, axis=0, out=out)
+    out *= periods
+    return out
+
+def annual_vol(returns, periods=256, ddof=0, out=None):
+    """
+    Standard deviation of each asset's period returns scaled to a year, the
+    population deviation (ddof = 0) as in blacklitterman.stddev
+
+    returns:        dates x assets matrix of period returns
+    periods:        periods in a year
+    out:            optional array of one value per asset to write into
+    output:         annual volatility per asset
+    """
+    out = np.std(returns, axis=0, ddof=ddof, out=out)
+    out *= np.sqrt(periods)
+    return out
+
+def compounded_return(returns, periods=250, out=None):
+    """
+    Compounded annual growth rate of each asset, prod(1 + r) ** (periods /
+    dates) - 1, summed in logs so long histories do not overflow
+
+    returns:        dates x assets matrix of period returns
+    periods:        periods in a year
+    out:            optional array of one value per asset to write into
+    output:         compounded annual return per asset
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    growth = np.sum(np.log1p(returns), axis=0)
+    return np.expm1(growth * (periods / float(len(returns))), out=out)
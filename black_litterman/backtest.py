@@ -0,0 +1,101 @@
+#Rolling window backtest of the black_litterman model over a date aligned return panel
+
+import os
+import numpy as np
+from numpy.lib.format import open_memmap
+
+import posterior
+import rolling
+
+
+def backtest(dates, returns, weights, views, return_views, directory, window=250, step=21, sharpe=.5,
+        workers=None, chunks=None):
+    """
+    Rebalances every step dates on the window dates before it, as the
+    blacklitterman script does for one date: covariance of the window,
+    risk from the sharpe ratio of the equilibrium weights, tau = 1 / window,
+    omega the diagonal of views tau covariance views'. The weights are held
+    over the next step dates.
+
+    Rebalance dates are split into contiguous chunks run on a process pool,
+    within a chunk one RollingCovariance rolls from window to window. Each
+    chunk is written to the output as soon as it finishes
+
+    dates:          dates of the return rows, see yfinance.return_panel
+    returns:        dates x assets matrix of (excess) returns
+    weights:        equilibrium weights
+    views:          views x assets pick matrix
+    return_views:   view returns, one set or one per rebalance date
+    directory:      output directory, gets dates.npy (rebalance dates),
+                    weights.npy and expected.npy (rebalances x assets) and
+                    returns.npy (compounded portfolio return of each holding
+                    period)
+    window:         dates in each estimation window
+    step:           dates between rebalances
+    sharpe:         sharpe ratio of the equilibrium portfolio
+    workers:        processes, defaults to the executor's own
+    chunks:         pieces the rebalance dates are split into, defaults to
+                    the number of cpus
+    output:         [dates, weights, expected, returns] memory mapped from
+                    directory
+    """
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    returns = np.ascontiguousarray(returns, dtype=np.float64)
+    ends = np.arange(window, len(returns), step)
+    return_views = np.broadcast_to(np.asarray(return_views, dtype=np.float64), (len(ends), len(views)))
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+
+    assets = returns.shape[1]
+    history = [open_memmap(os.path.join(directory, "dates.npy"), "w+", "datetime64[D]", (len(ends),)),
+            open_memmap(os.path.join(directory, "weights.npy"), "w+", np.float64, (len(ends), assets)),
+            open_memmap(os.path.join(directory, "expected.npy"), "w+", np.float64, (len(ends), assets)),
+            open_memmap(os.path.join(directory, "returns.npy"), "w+", np.float64, (len(ends),))]
+    history[0][:] = np.asarray(dates)[ends - 1]
+
+    pieces = np.array_split(np.arange(len(ends)), chunks or os.cpu_count() or 1)
+    with ProcessPoolExecutor(workers) as pool:
+        jobs = {}
+        for piece in pieces:
+            if not piece.size:
+                continue
+            first, last = ends[piece[0]] - window, ends[piece[-1]] + step
+            job = pool.submit(run_windows, returns[first:last], ends[piece] - first, window, step,
+                    weights, views, return_views[piece], sharpe)
+            jobs[job] = piece
+        for job in as_completed(jobs):
+            piece = jobs[job]
+            for column, result in zip(history[1:], job.result()):
+                column[piece] = result
+
+    for column in history:
+        column.flush()
+    return history
+
+def run_windows(returns, ends, window, step, weights, views, return_views, sharpe):
+    """
+    The rebalances of one chunk, oldest first, rolling one covariance
+    estimate forward
+
+    returns:        the chunk's return rows, from its first window to its
+                    last holding period
+    ends:           row after each estimation window
+    output:         [weights, expected returns, holding period returns]
+    """
+    estimator = rolling.RollingCovariance(returns.shape[1], window=window)
+    position = ends[0] - window
+    new_weights = np.empty((len(ends), returns.shape[1]))
+    expected = np.empty((len(ends), returns.shape[1]))
+    held = np.empty(len(ends))
+    for x, end in enumerate(ends):
+        estimator.extend(returns[position:end])
+        position = end
+        covar_matrix = estimator.covariance()
+        tau = estimator.tau()
+        risk = sharpe / np.sqrt(np.dot(weights, np.dot(covar_matrix, weights)))
+        view_error = np.diag(np.diag(np.dot(views, np.dot(tau * covar_matrix, views.T))))
+
+        result = posterior.black_litterman(risk, weights, covar_matrix, tau, views, return_views[x], view_error)
+        expected[x], new_weights[x] = result[0], result[1]
+        held[x] = np.prod(1 + np.dot(returns[end:end + step], new_weights[x])) - 1
+    return [new_weights, expected, held]
@@ -47,8 +47,8 @@
 #
 
 import yfinance
+import posterior
 import numpy as np
-from scipy import linalg
 
 # blacklitterman
 #   This function performs the Black-Litterman blending of the prior
@@ -69,28 +69,11 @@ from scipy import linalg
 #   lambda - A measure of the impact of each view on the posterior estimates.
 #
 def altblacklitterman(delta, weq, sigma, tau, P, Q, Omega):
-    # Reverse optimize and back out the equilibrium returns
-    # This is formula (12) page 6.
-    pi = weq.dot(sigma * delta)
-    # We use tau * sigma many places so just compute it once
-    ts = tau * sigma
-    # Compute posterior estimate of the mean
-    # This is a simplified version of formula (8) on page 4.
-    middle = linalg.inv(np.dot(np.dot(P,ts),P.T) + Omega)
-    er = np.expand_dims(pi,axis=0).T + np.dot(np.dot(np.dot(ts,P.T),middle),(Q - np.expand_dims(np.dot(P,pi.T),axis=1)))
-    # Compute posterior estimate of the mean
-    # This is a simplified version of formula (8) on page 4.
-    middle = linalg.inv(np.dot(np.dot(P,ts),P.T) + Omega)
-    er = np.expand_dims(pi,axis=0).T + np.dot(np.dot(np.dot(ts,P.T),middle),(Q - np.expand_dims(np.dot(P,pi.T),axis=1)))
-    # Compute posterior estimate of the uncertainty in the mean
-    # This is a simplified and combined version of formulas (9) and (15)
-    # Compute posterior weights based on uncertainty in mean
-    w = er.T.dot(linalg.inv(delta * sigma)).T
-    # Compute lambda value
-    # We solve for lambda from formula (17) page 7, rather than formula (18)
-    # just because it is less to type, and we've already computed w*.
-    lmbda = np.dot(linalg.pinv(P).T,(w.T * (1 + tau) - weq).T)
-    return [er, w, lmbda]
+    # The posterior mean (formula (8)), the weights and lambda (formula (17))
+    # are computed once from Cholesky factors of sigma and of
+    # P * tau * sigma * P' + Omega rather than explicit inverses.
+    er, w, lmbda, cov = posterior.black_litterman(delta, weq, sigma, tau, P, Q, Omega)
+    return [er[:, None], w[:, None], lmbda[:, None]]
 
 # idz_omega
 #   This function computes the Black-Litterman parameters Omega from
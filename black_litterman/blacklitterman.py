@@ -1,60 +1,41 @@
 # Black Litterman based off of http://corporate.morningstar.com/ib/documents/MethodologyDocuments/IBBAssociates/BlackLitterman.pdf
 
 import yfinance
+import covariance
+import analytics
+import posterior
 from numpy import dot
-from numpy.linalg import inv
+from scipy.linalg import cho_factor, cho_solve
 import numpy as np
 import pandas as pd
 import math
-from scipy.stats.stats import pearsonr
 
-def returns(tickers, rate):
-    rets = {}
-    for x in tickers:
-        stock = yfinance.parse_yfin(prefix + x + postfix)
-        rets.update({x:risk_free_rate(stock, rate)})
-    return rets;
+def returns(tickers, rate, missing="drop"):
+    #excess returns of all tickers on common dates, one row per date
+    dates, rets = yfinance.return_panel([prefix + x + postfix for x in tickers], missing)
+    return pd.DataFrame(risk_free_rate(rets, rate), index=dates, columns=tickers, copy=False)
 
 def risk_free_rate(stock, rate):
-    daily_rate = math.pow(1 + rate, 1/250.0) - 1
-    for x in range(len(stock)):
-        stock[x] = stock[x] - daily_rate
-    return stock
+    #a new array, the returns passed in are left alone
+    return analytics.excess_returns(stock, rate)
 
 def calc_mean(data):
-    return sum(data)/len(data)
+    #per period, not annualized
+    return analytics.annual_mean(data, periods=1)
 
 def stddev(data):
-    mean = calc_mean(data)
-    summation = 0
-    for x in data:
-        summation += (x - mean) ** 2
-    return math.sqrt(summation/len(data))
+    return analytics.annual_vol(data, periods=1)
 
 def correl_matrix(assets, tickers):
-    corr_matrix = np.zeros((len(assets.columns), len(assets.columns)))
-    for i in range(len(assets.columns)):
-        for j in range(len(assets.columns)):
-            corr_matrix[i][j] = pearsonr(assets[tickers[i]], 
-                    assets[tickers[j]])[0]
-            corr_matrix[j][i] = pearsonr(assets[tickers[i]], 
-                    assets[tickers[j]])[0]
-
-    return corr_matrix 
+    return covariance.covariance(assets[tickers].values)[1]
 
 def stddev_matrix(assets, tickers):
-    #assumes len(assets) = num of assets
-    #len(assets[0]) = length of time series
-    dev_matrix = np.zeros((len(assets.columns), len(assets.columns)))
-    for x in range(len(assets.columns)):
-        dev_matrix[x][x] = stddev(assets[tickers[x]])*16 #annualized, 256 days in a year
-
-    return dev_matrix
+    #annualized, 256 days in a year
+    return np.diag(covariance.covariance(assets[tickers].values)[2])
 
-def cov_matrix(assets, tickers):
-    corr_matrix = correl_matrix(assets, tickers)
-    dev_matrix = stddev_matrix(assets, tickers)
-    return np.dot(np.dot(dev_matrix, corr_matrix), dev_matrix)
+def cov_matrix(assets, tickers, method="sample", halflife=None):
+    #method "ledoit_wolf" or "ewma" (with halflife in days) for a steadier estimate
+    return covariance.covariance(assets[tickers].values, method, halflife)[0]
 
 def diagonalize(data):
     for x in range(len(data)):
@@ -69,38 +50,19 @@ def risk_profile(sharpe, weights, covar_matrix):
 def excess(covar_matrix, weights, risk):
     return dot(covar_matrix, weights) * risk
 
-def error(covar_matrix, tau):
-    return inv(covar_matrix * tau)
-
 def omega(views, covar_matrix, tau):
     return diagonalize(dot(dot((views * tau), covar_matrix), views.T))
 
-def inside(return_error, views, omega):
-    return return_error + dot(dot(views.T, omega_inv), views) 
-
-def second_multiplier(return_error, equal_excess, views, omega, return_views):
-    return dot(return_error, equal_excess) + dot(dot(views.T, omega_inv), return_views)
-
-def post_exp_ret(first_mult, second_mult):
-    return dot(inv(first_mult), second_mult)
-
-def post_cov(return_error, views, omega_inv):
-        return inv(return_error + dot(dot(views.T, omega_inv.T), views))
-
 def new_weights(risk, covar_matrix, post_ret):
-        return 1/risk * dot(inv(covar_matrix), post_ret)
+        return 1/risk * cho_solve(cho_factor(covar_matrix), post_ret)
 
 def new_weights_all(excess_return, weights, rets, tickers, views, return_views):
+        #the whole posterior in one pass, see posterior.black_litterman
         tau = 1/len(rets[tickers[0]])
         covar_matrix = cov_matrix(rets, tickers)
         risk = risk_profile(excess_return, weights, covar_matrix)
-        equal_excess = excess(covar_matrix, weights, risk)
-        return_error = error(covar_matrix, tau)
-        omega_inv = omega_inverse(views, covar_matrix, tau)
-        first_mult = first_multiplier(return_error, views, omega_inv)
-        second_mult = second_multiplier(return_error, equal_excess, views, omega_inv, return_views)
-        post_ret = post_exp_ret(first_mult, second_mult)
-        return 1/risk * dot(inv(covar_matrix), post_ret)
+        view_error = omega(views, covar_matrix, tau)
+        return posterior.black_litterman(risk, weights, covar_matrix, tau, views, return_views, view_error)[1]
         
 
 tickers = ["aapl", "cly", "dbb", "eem", "emb", "fxe", "gld", "goog", "gs", 
@@ -115,7 +77,6 @@ weights = np.array([.25147, .00014, .00013, .02181, .00186, .00011, .01745,
 
 rets = returns(tickers, .001)
 tau = 1/len(rets[tickers[0]])
-rets = pd.DataFrame(rets, columns=tickers)
 covar_matrix = cov_matrix(rets, tickers)
 risk = risk_profile(.5, weights, covar_matrix)
 equal_excess = excess(covar_matrix, weights, risk)
@@ -123,7 +84,6 @@ equal_excess = excess(covar_matrix, weights, risk)
 #what = map(calc_mean, returns)
 
 #weights = dot(inv((cov_matrix(rets, tickers) * risk)), equal_excess) --- just to check work
-return_error = error(covar_matrix, tau)
 
 ######views
 views = np.array([
@@ -131,14 +91,11 @@ views = np.array([
     [0, 0, 0, 0, 0, 0 ,0 ,1 ,0 ,0 ,0 ,0 ,0 ,0 ,0 ,0 ,0 ,0 ,0 ,0]])#,
 #    [0, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0, 0]])
 return_views = np.array([.10, .07])#, .05])
-omega_inv = omega_inverse(views, covar_matrix, tau)
+view_error = omega(views, covar_matrix, tau)
 
 ###### combining
-first_mult = first_multiplier(return_error, views, omega_inv)
-second_mult = second_multiplier(return_error, equal_excess, views, omega_inv, return_views)
-post_ret = post_exp_ret(first_mult, second_mult)
-post_covar = post_cov(return_error, views, omega_inv)
-new_weight = new_weights(risk, covar_matrix, post_ret)
+post_ret, new_weight, view_impact, post_covar = posterior.black_litterman(risk, weights, covar_matrix, tau,
+        views, return_views, view_error)
 ###testing
 
 #dev_matrix = np.array([[.07, 0, 0, 0],
@@ -153,11 +110,6 @@ new_weight = new_weights(risk, covar_matrix, post_ret)
 #
 #risk = 2.24
 #covar_matrix = dot(dot(dev_matrix, corr_matrix), dev_matrix)
-#omega_inv = omega_inverse(views, covar_matrix, .0083)
-#return_error = error(covar_matrix, .0083)
-#equal_excess = excess(covar_matrix, weights, risk)
-#first_mult = first_multiplier(return_error, views, omega_inv)
-#second_mult = second_multiplier(return_error, equal_excess, views, omega_inv, return_views)
-#post_ret = post_exp_ret(first_mult, second_mult)
-##posterior = inv(equal_return_error2 + dot(dot(views.T, omega_inverse2.T), views))
-#new_weight = new_weights(risk, covar_matrix, post_ret)
+#view_error = omega(views, covar_matrix, .0083)
+#post_ret, new_weight, view_impact, post_covar = posterior.black_litterman(risk, weights, covar_matrix, .0083,
+#        views, return_views, view_error)
@@ -0,0 +1,101 @@
+#Covariance estimates for the black_litterman model from a dates x assets return matrix
+
+import numpy as np
+
+
+def covariance(returns, method="sample", halflife=None, periods=256):
+    """
+    Annualized covariance of the assets in one matrix product over the
+    centered returns, with the correlation and volatilities it implies
+
+    returns:        dates x assets matrix of periodic returns
+    method:         "sample", "ledoit_wolf" (sample shrunk towards a scaled
+                    identity) or "ewma" (exponentially weighted)
+    halflife:       number of dates over which an ewma weight halves
+    periods:        return periods in a year, 256 as in stddev_matrix
+    output:         [covariance, correlation, volatilities]
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    if method == "ewma":
+        if halflife is None:
+            raise ValueError("ewma needs a halflife")
+        weights = ewma_weights(len(returns), halflife)
+        centered = returns - np.dot(weights, returns)
+        scaled = centered * np.sqrt(weights)[:, None]
+        cov = np.dot(scaled.T, scaled)
+    elif method in ("sample", "ledoit_wolf"):
+        centered = returns - returns.mean(axis=0)
+        cov = np.dot(centered.T, centered) / len(returns)
+        if method == "ledoit_wolf":
+            cov = ledoit_wolf(centered, cov)[0]
+    else:
+        raise ValueError("method unrecognized: " + str(method))
+
+    cov *= periods
+    vols = np.sqrt(np.diag(cov))
+    corr = cov / np.outer(vols, vols)
+    return [cov, corr, vols]
+
+def ewma_weights(length, halflife):
+    """
+    Exponentially decaying weights that sum to one, the last date heaviest
+
+    length:         number of dates
+    halflife:       number of dates over which a weight halves
+    output:         array of weights, oldest first
+    """
+    weights = 0.5 ** (np.arange(length - 1, -1, -1) / float(halflife))
+    return weights / weights.sum()
+
+def ledoit_wolf(centered, sample=None):
+    """
+    Ledoit and Wolf (2004) shrinkage of the sample covariance towards
+    mu * identity, mu the average variance
+
+    centered:       dates x assets matrix of demeaned returns
+    sample:         centered.T centered / dates when already computed
+    output:         [shrunk covariance, shrinkage intensity in [0, 1]]
+    """
+    length, assets = centered.shape
+    if sample is None:
+        sample = np.dot(centered.T, centered) / length
+    mu = np.trace(sample) / assets
+    target = sample.copy()
+    target.flat[::assets + 1] -= mu
+    distance = np.sum(target ** 2)
+    #sum over dates of |x x' - sample|^2 without forming any x x'
+    spread = (np.sum(np.sum(centered ** 2, axis=1) ** 2) - length * np.sum(sample ** 2)) / length ** 2
+    shrinkage = min(spread, distance) / distance if distance > 0 else 0.0
+
+    shrunk = sample * (1 - shrinkage)
+    shrunk.flat[::assets + 1] += shrinkage * mu
+    return [shrunk, shrinkage]
+
+def factor_covariance(returns, factors, periods=256):
+    """
+    Low rank plus diagonal covariance from the leading principal components,
+    B B' + diag(specific). The components come from the smaller of the
+    dates x dates and assets x assets Gram matrices of the centered returns,
+    so a universe with more assets than dates never forms an assets x assets
+    matrix
+
+    returns:        dates x assets matrix of periodic returns
+    factors:        number of principal components kept
+    periods:        return periods in a year
+    output:         [assets x factors loadings B, factors x factors factor
+                    covariance (identity), specific variances], annualized
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    centered = returns - returns.mean(axis=0)
+    if len(returns) < returns.shape[1]:
+        #X X' u = s^2 u gives the loadings X' u = s v directly
+        values, vectors = np.linalg.eigh(np.dot(centered, centered.T))
+        loadings = np.dot(centered.T, vectors[:, ::-1][:, :factors])
+    else:
+        values, vectors = np.linalg.eigh(np.dot(centered.T, centered))
+        loadings = vectors[:, ::-1][:, :factors] * np.sqrt(np.maximum(values[::-1][:factors], 0))
+    loadings *= np.sqrt(periods / float(len(returns)))
+    variances = np.sum(centered ** 2, axis=0) * (periods / float(len(returns)))
+    #what the factors leave of each variance, kept positive so the matrix stays definite
+    specific = np.maximum(variances - np.sum(loadings ** 2, axis=1), 1e-8 * variances.max())
+    return [loadings, np.eye(factors), specific]
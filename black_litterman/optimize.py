@@ -0,0 +1,153 @@
+#Constrained mean-variance weights from the black_litterman posterior
+
+import numpy as np
+from scipy import linalg
+
+
+def mean_variance(mu, sigma, delta, budget=True, lower=0.0, upper=None, start=None, tol=1e-12, max_iter=50):
+    """
+    Maximizes w' mu - delta / 2 w' sigma w subject to sum(w) = 1 (budget) and
+    lower <= w <= upper with a primal-dual active set method: guess which
+    weights sit on a bound, solve the equality constrained problem on the
+    rest, move weights whose gradient disagrees with the guess and repeat.
+    The guess comes from start, so a nearby solution (the neighbour on a
+    frontier) usually finishes in one solve, and while the free weights stay
+    the same their Cholesky factor is reused. Without budget or bounds this
+    is new_weights, sigma^-1 mu / delta
+
+    mu:             expected returns, e.g. the posterior mean
+    sigma:          covariance matrix
+    delta:          risk aversion, the scripts' risk
+    budget:         weights sum to one
+    lower:          lower bound(s), 0 for long only, None for none
+    upper:          upper bound(s), None for none
+    start:          an earlier result for the same mu and sigma
+    output:         [weights, budget multiplier, active set iterations,
+                    [free weights, their Cholesky factor]]
+    """
+    mu = np.ravel(mu).astype(np.float64)
+    assets = len(mu)
+    lower = np.full(assets, -np.inf) if lower is None else np.broadcast_to(np.asarray(lower, dtype=np.float64), (assets,))
+    upper = np.full(assets, np.inf) if upper is None else np.broadcast_to(np.asarray(upper, dtype=np.float64), (assets,))
+    if budget and (lower.sum() > 1 or upper.sum() < 1):
+        raise ValueError("bounds leave no weights that sum to one")
+    #scales the gradient step of the active set rule to the weights
+    c = 1.0 / (delta * np.mean(np.diag(sigma)))
+
+    if start is None:
+        w, nu, factored = np.clip(np.full(assets, 1.0 / assets), lower, upper), 0.0, [None, None]
+    else:
+        w, nu, factored = np.asarray(start[0], dtype=np.float64), start[1], start[3]
+    at_lower, at_upper = active(w - c * (delta * np.dot(sigma, w) - mu), budget, lower, upper)
+
+    for i in range(max_iter):
+        free = ~(at_lower | at_upper)
+        w = np.where(at_lower, lower, np.where(at_upper, upper, 0.0))
+        if free.any():
+            if factored[0] is None or not np.array_equal(factored[0], free):
+                factored = [free, linalg.cho_factor(sigma[np.ix_(free, free)])]
+            factor = factored[1]
+            rhs = mu[free] - delta * np.dot(sigma, w)[free]
+            w[free] = linalg.cho_solve(factor, rhs) / delta
+            if budget:
+                ones = linalg.cho_solve(factor, np.ones(free.sum())) / delta
+                nu = (w[free].sum() - (1 - w[~free].sum())) / ones.sum()
+                w[free] -= nu * ones
+        elif budget:
+            #every weight on a bound, the multiplier must keep the lower ones pushing down and
+            #the upper ones pushing up, take the middle of that range
+            push = mu - delta * np.dot(sigma, w)
+            least = np.max(push[at_lower]) if at_lower.any() else np.min(push[at_upper])
+            most = np.min(push[at_upper]) if at_upper.any() else least
+            nu = (least + most) / 2
+
+        new_lower, new_upper = active(w - c * (delta * np.dot(sigma, w) - mu), budget, lower, upper)
+        if np.array_equal(new_lower, at_lower) and np.array_equal(new_upper, at_upper):
+            return [w, nu, i + 1, factored]
+        at_lower, at_upper = new_lower, new_upper
+
+    #the active set cycled, finish with projected gradient from where it got to
+    w = projected_gradient(mu, sigma, delta, budget, lower, upper, np.clip(w, lower, upper), tol)
+    return [w, multiplier(mu, sigma, delta, w, lower, upper) if budget else 0.0, max_iter, [None, None]]
+
+def shift(v, budget, lower, upper):
+    #the shift s for which clip(v - s, lower, upper) sums to one (0 without budget). The sum is
+    #piecewise linear in s with kinks where a weight meets a bound, so a binary search over the
+    #kinks and one interpolation find it exactly
+    if not budget:
+        return 0.0
+    total = lambda s: np.clip(v - s, lower, upper).sum()
+    points = np.concatenate([v - upper, v - lower])
+    points = np.sort(points[np.isfinite(points)])
+    if not points.size or total(points[0]) < 1:
+        #before the first kink the weights without an upper bound move with s, the rest sit on it
+        free = ~np.isfinite(upper)
+        return (v[free].sum() + upper[~free].sum() - 1) / free.sum() if free.any() else points[0]
+    if total(points[-1]) > 1:
+        free = ~np.isfinite(lower)
+        return (v[free].sum() + lower[~free].sum() - 1) / free.sum() if free.any() else points[-1]
+    low, high = 0, len(points) - 1
+    while high - low > 1:
+        middle = (low + high) // 2
+        if total(points[middle]) >= 1:
+            low = middle
+        else:
+            high = middle
+    a, b = points[low], points[high]
+    total_a, total_b = total(a), total(b)
+    return a if total_a == total_b else a + (total_a - 1) * (b - a) / (total_a - total_b)
+
+def active(v, budget, lower, upper):
+    #weights a projected gradient step from v would put on their lower and upper bounds,
+    #with the budget shift every guess leaves weights that can still sum to one
+    v = v - shift(v, budget, lower, upper)
+    return v < lower, v > upper
+
+def project(v, budget, lower, upper):
+    #closest point of the box (and budget hyperplane) to v
+    return np.clip(v - shift(v, budget, lower, upper), lower, upper)
+
+def projected_gradient(mu, sigma, delta, budget, lower, upper, w, tol, max_iter=100000):
+    #accelerated projected gradient, step 1 / the largest curvature
+    step = 1.0 / (delta * linalg.eigvalsh(sigma, subset_by_index=[len(mu) - 1, len(mu) - 1])[0])
+    y, t = w, 1.0
+    for i in range(max_iter):
+        previous = w
+        w = project(y - step * (delta * np.dot(sigma, y) - mu), budget, lower, upper)
+        if np.max(np.abs(w - previous)) < tol:
+            break
+        t, t_next = (1 + np.sqrt(1 + 4 * t * t)) / 2, t
+        y = w + (t_next - 1) / t * (w - previous)
+    return w
+
+def multiplier(mu, sigma, delta, w, lower, upper):
+    #budget multiplier from the weights strictly inside their bounds
+    inside = (w > lower) & (w < upper)
+    gradient = mu - delta * np.dot(sigma, w)
+    return np.mean(gradient[inside]) if inside.any() else np.median(gradient)
+
+def frontier(mu, sigma, deltas, budget=True, lower=0.0, upper=None):
+    """
+    Constrained weights for many risk aversions, each solve warm started
+    from its neighbour's
+
+    mu:             expected returns, e.g. the posterior mean
+    sigma:          covariance matrix
+    deltas:         risk aversions
+    budget:         weights sum to one
+    lower:          lower bound(s), 0 for long only, None for none
+    upper:          upper bound(s), None for none
+    output:         [weights (deltas x assets), expected returns, volatilities,
+                    total active set iterations]
+    """
+    deltas = np.ravel(deltas)
+    weights = np.empty((len(deltas), len(np.ravel(mu))))
+    iterations = 0
+    result = None
+    for x in np.argsort(deltas):
+        result = mean_variance(mu, sigma, deltas[x], budget, lower, upper, result)
+        weights[x] = result[0]
+        iterations += result[2]
+    expected = np.dot(weights, np.ravel(mu))
+    vols = np.sqrt(np.sum(np.dot(weights, sigma) * weights, axis=1))
+    return [weights, expected, vols, iterations]
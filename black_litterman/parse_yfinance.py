@@ -1,17 +1,11 @@
 import pandas as pd 
 
+import yfinance
+import analytics
 
-def parse_yfin(file_name):
-    date = []   
-    adj_close_price = []
 
-    #i can probably encapsulate this
-    with open(file_name) as f:
-        data = f.readline()
-        for x in reversed(list(f)):
-            split_data = x.rstrip().split(',')
-            date.append(split_data[0])
-            adj_close_price.append(float(split_data[6]))
+def parse_yfin(file_name):
+    date, adj_close_price = yfinance.load_prices(file_name)
 
     returns = get_returns(adj_close_price)
 
@@ -22,11 +16,7 @@ def format_returns(date, returns):
             columns=["date", "return"])
 
 def get_returns(price_series):
-    returns = []
-    for x in range(len(price_series) - 1):
-        returns.append((price_series[x + 1] - price_series[x]) /\
-                price_series[x])
-    return returns
+    return analytics.simple_returns(price_series)
         
 
 prefix = "data/"
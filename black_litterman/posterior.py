@@ -0,0 +1,213 @@
+#Black-Litterman posterior from Cholesky factorizations, shared by black_litterman.py and blacklitterman.py
+
+import numpy as np
+from scipy import linalg
+
+
+def black_litterman(delta, weq, sigma, tau, P, Q, Omega):
+    """
+    Blends the equilibrium prior with the views (Idzorek's alternate
+    reference model). sigma, P tau sigma P' + Omega and P P' are each
+    factorized once and every inverse in the formulas is a triangular
+    solve against those factors
+
+    delta:          risk aversion of the equilibrium portfolio
+    weq:            equilibrium weights
+    sigma:          prior covariance matrix
+    tau:            uncertainty in the prior estimate of the mean
+    P:              views x assets pick matrix
+    Q:              view returns
+    Omega:          views x views covariance of the views
+    output:         [posterior mean, unconstrained weights, lambda (impact of
+                    each view), covariance of the posterior mean]. The
+                    covariance of returns is sigma plus the last one
+    """
+    weq = np.ravel(weq)
+    Q = np.ravel(Q)
+    P = np.atleast_2d(P)
+    sigma_factor = linalg.cho_factor(sigma)
+    # Reverse optimize and back out the equilibrium returns, formula (12)
+    pi = delta * np.dot(sigma, weq)
+
+    # Formula (8): pi + tau sigma P' (P tau sigma P' + Omega)^-1 (Q - P pi)
+    tsp = tau * np.dot(sigma, P.T)
+    middle = linalg.cho_factor(np.dot(P, tsp) + Omega)
+    er = pi + np.dot(tsp, linalg.cho_solve(middle, Q - np.dot(P, pi)))
+    # Formulas (9) and (15): tau sigma - tau sigma P' middle^-1 P tau sigma
+    cov = tau * sigma - np.dot(tsp, linalg.cho_solve(middle, tsp.T))
+
+    w = linalg.cho_solve(sigma_factor, er) / delta
+    # Formula (17), pinv(P)' = (P P')^-1 P for a full row rank P
+    lmbda = linalg.cho_solve(linalg.cho_factor(np.dot(P, P.T)), np.dot(P, w * (1 + tau) - weq))
+    return [er, w, lmbda, cov]
+
+def black_litterman_batch(delta, weq, sigma, tau, P, Q, Omega, with_cov=False):
+    """
+    black_litterman for S view scenarios at once, sharing the prior, the pick
+    matrix and the factor of P P'. The K x K systems of all scenarios
+    are solved in one broadcast call and, since sigma^-1 pi = delta weq, the
+    weights need no N x N solve at all
+
+    delta:          risk aversion of the equilibrium portfolio
+    weq:            equilibrium weights
+    sigma:          prior covariance matrix
+    tau:            number, or one per scenario
+    P:              views x assets pick matrix
+    Q:              S x views view returns
+    Omega:          S x views x views covariances of the views
+    with_cov:       also return the S x N x N covariances of the posterior mean
+    output:         [S x N posterior means, S x N weights, S x K lambdas] and
+                    the covariances when asked for
+    """
+    weq = np.ravel(weq)
+    P = np.atleast_2d(P)
+    Q = np.atleast_2d(Q)
+    tau = np.broadcast_to(np.asarray(tau, dtype=np.float64), (len(Q),))[:, None]
+    pi = delta * np.dot(sigma, weq)
+    sp = np.dot(sigma, P.T)
+
+    middle = tau[:, :, None] * np.dot(P, sp) + Omega
+    x = tau * np.linalg.solve(middle, (Q - np.dot(P, pi))[:, :, None])[:, :, 0]
+    er = pi + np.dot(x, sp.T)
+    w = weq + np.dot(x, P) / delta
+    lmbda = linalg.cho_solve(linalg.cho_factor(np.dot(P, P.T)), np.dot(P, (w * (1 + tau) - weq).T)).T
+    if not with_cov:
+        return [er, w, lmbda]
+    spread = np.matmul(sp, np.linalg.solve(middle, np.broadcast_to(sp.T, middle.shape[:1] + sp.T.shape)))
+    cov = tau[:, :, None] * sigma - tau[:, :, None] ** 2 * spread
+    return [er, w, lmbda, cov]
+
+def confidence_omega(conf, P, sigma, tau):
+    """
+    Diagonal Omegas from Idzorek confidences with the closed form
+    (1 - conf) / conf * P tau sigma P' of bl_omega, for many scenarios
+
+    conf:           confidences in (0, 1], views or S x views
+    P:              views x assets pick matrix
+    sigma:          prior covariance matrix
+    tau:            number, or one per scenario
+    output:         S x views x views diagonal Omegas
+    """
+    conf = np.atleast_2d(conf)
+    tau = np.broadcast_to(np.asarray(tau, dtype=np.float64), (len(conf),))[:, None]
+    P = np.atleast_2d(P)
+    variance = np.einsum("ij,jk,ik->i", P, sigma, P)
+    diagonal = (1 - conf) / conf * tau * variance
+    Omega = np.zeros(diagonal.shape + diagonal.shape[-1:])
+    idx = np.arange(diagonal.shape[-1])
+    Omega[:, idx, idx] = diagonal
+    return Omega
+
+def factor_product(loadings, factor_cov, specific, x):
+    """
+    sigma x for sigma = B F B' + diag(specific), in O(assets * factors)
+
+    x:              vector or assets x columns matrix
+    """
+    specific = specific.reshape((-1,) + (1,) * (np.ndim(x) - 1))
+    return np.dot(loadings, np.dot(factor_cov, np.dot(loadings.T, x))) + specific * x
+
+def factor_solve(loadings, factor_cov, specific, x):
+    """
+    sigma^-1 x for sigma = B F B' + diag(specific) by the Woodbury identity,
+    D^-1 x - D^-1 B (F^-1 + B' D^-1 B)^-1 B' D^-1 x, with factors x factors
+    solves only
+
+    x:              vector or assets x columns matrix
+    """
+    specific = specific.reshape((-1,) + (1,) * (np.ndim(x) - 1))
+    scaled = x / specific
+    inner = linalg.cho_solve(linalg.cho_factor(factor_cov), np.eye(len(factor_cov)))
+    inner += np.dot(loadings.T, loadings / specific.reshape(-1, 1))
+    return scaled - np.dot(loadings, linalg.cho_solve(linalg.cho_factor(inner), np.dot(loadings.T, scaled))) / specific
+
+def black_litterman_factor(delta, weq, loadings, factor_cov, specific, tau, P, Q, Omega):
+    """
+    black_litterman for a factor covariance B F B' + diag(specific), see
+    covariance.factor_covariance. Every product with sigma goes through the
+    factors and every solve is views x views or factors x factors, so
+    thousands of assets never need an assets x assets matrix
+
+    loadings:       assets x factors B
+    factor_cov:     factors x factors F
+    specific:       specific variances
+    output:         [posterior mean, unconstrained weights, lambda, view
+                    loadings V]. The covariance of the posterior mean is
+                    tau sigma - V V'
+    """
+    weq = np.ravel(weq)
+    Q = np.ravel(Q)
+    P = np.atleast_2d(P)
+    pi = delta * factor_product(loadings, factor_cov, specific, weq)
+
+    tsp = tau * factor_product(loadings, factor_cov, specific, P.T)
+    middle = linalg.cho_factor(np.dot(P, tsp) + Omega, lower=True)
+    er = pi + np.dot(tsp, linalg.cho_solve(middle, Q - np.dot(P, pi)))
+    views = linalg.solve_triangular(middle[0], tsp.T, lower=True).T
+
+    w = factor_solve(loadings, factor_cov, specific, er) / delta
+    lmbda = linalg.cho_solve(linalg.cho_factor(np.dot(P, P.T)), np.dot(P, w * (1 + tau) - weq))
+    return [er, w, lmbda, views]
+
+def idzorek_omega(conf, delta, weq, sigma, tau, P, Q, model="alternative", tol=1e-12, max_iter=200):
+    """
+    Idzorek's exact confidence calibration: each view's omega is the one for
+    which that view alone tilts the weights away from the no view weights by
+    conf times the tilt of the view at 100% confidence. All views are solved
+    together by bisection on u = s / (s + omega), s = p tau sigma p', and a
+    single view posterior costs O(assets) since sigma^-1 sigma p' = p' needs
+    no solve.
+
+    Model "alternative" (weights sigma^-1 er / delta) is the one every
+    engine here uses, black_litterman, black_litterman_batch,
+    black_litterman_factor, altblacklitterman and the backtest, so it is the
+    default. Its tilt is exactly u and this reproduces the closed form of
+    bl_omega. "canonical" is for an engine outside this package whose weights
+    use the posterior covariance sigma + M: (sigma + M)^-1 is a rank one
+    update of ((1 + tau) sigma)^-1 and the no view weights are weq / (1 + tau)
+
+    conf:           confidence of each view in (0, 1]
+    delta:          risk aversion of the equilibrium portfolio
+    weq:            equilibrium weights
+    sigma:          prior covariance matrix
+    tau:            uncertainty in the prior estimate of the mean
+    P:              views x assets pick matrix
+    Q:              view returns
+    model:          "alternative" (this package's engines) or "canonical"
+                    reference model
+    output:         views x views diagonal Omega
+    """
+    if model not in ("canonical", "alternative"):
+        raise ValueError("model unrecognized: " + str(model))
+    conf = np.ravel(conf).astype(np.float64)
+    weq = np.ravel(weq)
+    Q = np.ravel(Q)
+    P = np.atleast_2d(P)
+    pi = delta * np.dot(sigma, weq)
+    s = tau * np.einsum("ij,jk,ik->i", P, sigma, P)
+    surprise = Q - np.dot(P, pi)
+
+    def tilt(u):
+        #tilt of each single view posterior along its own view, u = 1 is 100% confidence.
+        #sigma^-1 er = delta weq + tau p (q - p pi) / (s + omega), and tau / (s + omega) = tau u / s
+        scale = tau * u / s
+        if model == "alternative":
+            return scale * surprise / delta
+        #Sherman-Morrison on (1 + tau) sigma - tau^2 (sigma p')(p sigma) / (s + omega)
+        beta = tau * scale
+        projected = np.dot(P, pi) + u * surprise
+        return (scale * surprise + beta * projected / ((1 + tau) - beta * s / tau)) / (delta * (1 + tau))
+
+    full = tilt(np.ones(len(conf)))
+    low = np.zeros(len(conf))
+    high = np.ones(len(conf))
+    for i in range(max_iter):
+        u = (low + high) / 2
+        above = tilt(u) / full > conf
+        high = np.where(above, u, high)
+        low = np.where(above, low, u)
+        if np.max(high - low) < tol:
+            break
+    u = (low + high) / 2
+    u[conf >= 1] = 1
+    return np.diag(s * (1 - u) / u)
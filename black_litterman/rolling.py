@@ -0,0 +1,141 @@
+#Running estimates of the mean and covariance of returns for daily refreshes of the black_litterman model
+
+import numpy as np
+
+import analytics
+
+
+class RollingCovariance(object):
+    """
+    Mean and covariance of a stream of return rows, each new row costing
+    O(assets^2) instead of a pass over the full history. Either every row
+    seen so far counts equally (Welford updates), only the last window rows
+    count (old rows are taken back out as they leave), or rows decay
+    exponentially with a halflife. Covariances are population (ddof = 0)
+    and annualized with periods, as in covariance.covariance
+
+    assets:         number of assets in a row
+    window:         keep only this many rows, None for all of them
+    halflife:       rows over which an ewma weight halves, None for equal weights
+    periods:        return periods in a year
+    rate:           annual risk free rate, see excess_mean
+    """
+
+    def __init__(self, assets, window=None, halflife=None, periods=256, rate=0.0):
+        if window is not None and halflife is not None:
+            raise ValueError("window and halflife are exclusive")
+        self.window = window
+        self.halflife = halflife
+        self.periods = periods
+        self.rate = rate
+        self.count = 0
+        self.mean = np.zeros(assets)
+        #co-moment, sum of outer products of deviations from the mean (ewma: the covariance)
+        self.comoment = np.zeros((assets, assets))
+        #rows still inside the window, a ring buffer starting at self.start
+        self.rows = np.zeros((window or 0, assets))
+        self.start = 0
+
+    def update(self, row):
+        """
+        Adds one row of returns, dropping the oldest one when the window is full
+
+        row:            returns of every asset for one date
+        """
+        row = np.asarray(row, dtype=np.float64)
+        if self.halflife is not None:
+            decay = 0.5 ** (1.0 / self.halflife)
+            deviation = row - self.mean if self.count else np.zeros(row.shape)
+            self.mean += (1 - decay) * deviation if self.count else row
+            self.comoment *= decay
+            self.comoment += decay * (1 - decay) * np.outer(deviation, deviation)
+            self.count += 1
+            return
+
+        if self.window is not None and self.count == self.window:
+            self.remove(self.rows[self.start])
+            self.rows[self.start] = row
+            self.start = (self.start + 1) % self.window
+        elif self.window is not None:
+            self.rows[(self.start + self.count) % self.window] = row
+        self.count += 1
+        deviation = row - self.mean
+        self.mean += deviation / self.count
+        self.comoment += np.outer(deviation, row - self.mean)
+
+    def remove(self, row):
+        #Welford's update run backwards
+        self.count -= 1
+        if self.count == 0:
+            self.mean[:] = 0
+            self.comoment[:] = 0
+            return
+        deviation = row - self.mean
+        self.mean -= deviation / self.count
+        self.comoment -= np.outer(deviation, row - self.mean)
+
+    def extend(self, rows):
+        """
+        Adds rows of returns oldest first
+
+        rows:           dates x assets matrix of returns
+        """
+        for row in np.asarray(rows, dtype=np.float64):
+            self.update(row)
+
+    def covariance(self):
+        """
+        output:         annualized covariance of the rows in the estimate
+        """
+        if self.halflife is not None:
+            return self.comoment * self.periods
+        return self.comoment * (self.periods / float(self.count))
+
+    def annual_mean(self):
+        """
+        output:         mean return per period scaled to a year
+        """
+        return self.mean * self.periods
+
+    def excess_mean(self):
+        """
+        output:         mean return per period over the daily risk free rate,
+                        compounded as in blacklitterman.risk_free_rate
+        """
+        return self.mean - analytics.daily_rate(self.rate)
+
+    def tau(self):
+        """
+        output:         1 / number of rows in the estimate, the scripts' tau
+        """
+        return 1.0 / min(self.count, self.window or self.count)
+
+    def save(self, file_name):
+        """
+        Checkpoints the whole state to an .npz file
+
+        file_name:      directory (abs or rel) to the file
+        """
+        np.savez(file_name, count=self.count, mean=self.mean, comoment=self.comoment, rows=self.rows,
+                start=self.start, window=-1 if self.window is None else self.window,
+                halflife=np.nan if self.halflife is None else self.halflife, periods=self.periods, rate=self.rate)
+
+    @classmethod
+    def load(cls, file_name):
+        """
+        Restores an estimator saved with save
+
+        file_name:      directory (abs or rel) to the file
+        output:         RollingCovariance
+        """
+        with np.load(file_name) as state:
+            window = int(state["window"])
+            halflife = float(state["halflife"])
+            estimator = cls(len(state["mean"]), None if window < 0 else window,
+                    None if np.isnan(halflife) else halflife, int(state["periods"]), float(state["rate"]))
+            estimator.count = int(state["count"])
+            estimator.start = int(state["start"])
+            estimator.mean[:] = state["mean"]
+            estimator.comoment[:] = state["comoment"]
+            estimator.rows[:] = state["rows"]
+        return estimator
@@ -1,54 +1,141 @@
 #Sets up data for the black_litterman model
 
+import os
 import pandas as pd 
 import numpy as np
 
+import analytics
 
-def parse_yfin(file_name):
+
+def parse_yfin(file_name, cache_dir=None):
     """
     Parses a CSV file from Yahoo Finance and reutrns the adjusted close
 
     file_name:          directory (abs or rel) to the file
+    cache_dir:          where the parsed prices are cached, see load_prices
     output:             list of daily returns
     
     """
-    date = []   
-    adj_close_price = []
-
-    #i can probably encapsulate this even more
-    with open(file_name) as f:
-        data = f.readline()
-        for x in reversed(list(f)):
-            split_data = x.rstrip().split(',')
-            date.append(split_data[0])
-            adj_close_price.append(float(split_data[6]))
+    dates, adj_close_price = load_prices(file_name, cache_dir)
 
     returns = calc_returns(adj_close_price)
 
-    return returns#, date[1:]
+    return returns#, dates[1:]
+
+def load_prices(file_name, cache_dir=None):
+    """
+    Loads the dates and adjusted close of a Yahoo Finance CSV, oldest first.
+    The parsed columns are kept in a binary .npy cache next to the file (or in
+    cache_dir) and memory mapped on later loads. The cache is rebuilt when the
+    CSV's size or modification time changes.
+
+    file_name:          directory (abs or rel) to the file
+    cache_dir:          cache directory, defaults to .cache beside the file
+    output:             (datetime64[D] array of dates, float64 array of adjusted
+                        close), read only when they come from the cache
+    """
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(file_name)), ".cache")
+    cache_name = os.path.join(cache_dir, os.path.basename(file_name) + ".npy")
+    info = os.stat(file_name)
+    stamp = "%d %d" % (info.st_size, info.st_mtime_ns)
+
+    try:
+        with open(cache_name + ".stamp") as f:
+            fresh = f.read() == stamp
+    except IOError:
+        fresh = False
+    if fresh:
+        table = np.load(cache_name, mmap_mode="r")
+        return table["date"], table["adj_close"]
+
+    table = parse_prices(file_name)
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    #write to temporary names first so a concurrent reader never sees half a file
+    with open(cache_name + ".tmp", "wb") as f:
+        np.save(f, table)
+    os.replace(cache_name + ".tmp", cache_name)
+    with open(cache_name + ".stamp.tmp", "w") as f:
+        f.write(stamp)
+    os.replace(cache_name + ".stamp.tmp", cache_name + ".stamp")
+    return table["date"], table["adj_close"]
+
+def parse_prices(file_name):
+    """
+    Parses the date and adjusted close columns of a Yahoo Finance CSV in one
+    pass of numpy's C parser, sorted oldest first (Yahoo files come newest first)
+
+    file_name:          directory (abs or rel) to the file
+    output:             structured array with fields date and adj_close
+    """
+    table = np.loadtxt(file_name, delimiter=",", skiprows=1, usecols=(0, 6), ndmin=1,
+            dtype=[("date", "datetime64[D]"), ("adj_close", np.float64)])
+    return table[np.argsort(table["date"], kind="stable")]
+
+def price_panel(file_names, missing="drop", workers=None, cache_dir=None):
+    """
+    Loads many Yahoo Finance CSVs concurrently and aligns their adjusted close
+    on date
+
+    file_names:         list of files, one per asset
+    missing:            what to do with a date some assets have no price for:
+                        "drop" keeps only the dates every asset trades,
+                        "ffill" carries the last price forward (dates before
+                        every asset has started are dropped), "nan" keeps them
+                        as nan
+    workers:            threads loading files, defaults to the executor's own
+    cache_dir:          see load_prices
+    output:             (datetime64[D] array of dates, C contiguous float64
+                        matrix of prices, dates x assets)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if missing not in ("drop", "ffill", "nan"):
+        raise ValueError("missing policy unrecognized: " + str(missing))
+    with ThreadPoolExecutor(workers) as pool:
+        series = list(pool.map(lambda file_name: load_prices(file_name, cache_dir), file_names))
+
+    #one join over the union of all dates
+    dates = np.unique(np.concatenate([date for date, price in series]))
+    prices = np.full((len(dates), len(series)), np.nan)
+    for x, (date, price) in enumerate(series):
+        prices[np.searchsorted(dates, date), x] = price
+
+    if missing == "ffill":
+        rows = np.where(np.isnan(prices), 0, np.arange(len(dates))[:, None])
+        np.maximum.accumulate(rows, axis=0, out=rows)
+        prices = prices[rows, np.arange(len(series))]
+    if missing != "nan":
+        keep = ~np.isnan(prices).any(axis=1)
+        dates, prices = dates[keep], np.ascontiguousarray(prices[keep])
+    return dates, prices
+
+def return_panel(file_names, missing="drop", workers=None, cache_dir=None):
+    """
+    Daily returns of many assets on common dates, see price_panel. A return
+    spans from the previous kept date, so dropped days are not lost
+
+    output:             (datetime64[D] array of the dates the returns end on,
+                        C contiguous float64 matrix of returns, dates x assets)
+    """
+    dates, prices = price_panel(file_names, missing, workers, cache_dir)
+    return dates[1:], analytics.simple_returns(prices)
 
 #FIXME:CALCULATE RISK FREE RETURNS
 def calc_returns(price_series):
     """
     Helper method to calculate a return given a list of prices
 
-    price_series:       list of prices
-    output:             list of returns
+    price_series:       list of prices, or dates x assets matrix
+    output:             array of returns
     """
-    returns = []
-    for x in range(len(price_series) - 1):
-        returns.append((price_series[x + 1] - price_series[x]) /\
-                price_series[x]) 
-    return returns
+    return analytics.simple_returns(price_series)
 
 #-------- possible will remove
 
-#calculates mean annual return given
+#calculates mean annual return given, compounded over 250 days a year
 def mean_ann_returns(daily_returns):
-    ann_return = 1
-    for x in range(len(daily_returns)):
-        ann_return *= (daily_returns[x] + 1)
-    return ann_return/(len(daily_returns)/250)
+    return analytics.compounded_return(daily_returns, 250)
 
 def format_returns(date, returns, asset_name):
     """
@@ -0,0 +1,88 @@
+import argparse
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import fdm
+import blackscholes
+
+#Accuracy against runtime for the FDM pricers. A vanilla call with Vol_L == Vol_H has the
+#Black-Scholes price, so every grid size on the ladder gets an exact error, the observed order of
+#convergence against the previous rung, wall time, peak traced memory and a Richardson
+#extrapolated value. importTime keeps an eye on what `import fdm` costs a library user.
+#Rows are plain dicts, written out as JSON lines.
+
+def richardson(coarse, fine, ratio=2.0, order=2):
+    #extrapolates two solves whose error falls as NAS^-order, fine on ratio times as many nodes
+    return fine + (fine - coarse) / (ratio ** order - 1)
+
+def importTime(module="fdm", repeat=5):
+    #best of repeat cold imports, each in a fresh interpreter
+    code = "import time; start = time.perf_counter(); import " + module + "; print(time.perf_counter() - start)"
+    here = os.path.dirname(os.path.abspath(__file__))
+    seconds = [float(subprocess.check_output([sys.executable, "-c", code], cwd=here)) for i in range(repeat)]
+    return {"benchmark": "import", "module": module, "seconds": min(seconds)}
+
+def price(pricer, NAS, method, stretch, Vol, r, Strike, Expiration):
+    if pricer == "option":
+        return fdm.option(Vol, Vol, r, "call", Strike, Expiration, NAS, 1, method, None, stretch)
+    elif pricer == "basket":
+        #only the low strike call leg, so the grid runs up to 2 * highStrike as the sweeps use it
+        return fdm.basket(Vol, Vol, r, Strike, Strike, 1.1 * Strike, Expiration, NAS, 1, 0, 0, method, None, stretch)
+    raise ValueError("pricer unrecognized: " + str(pricer))
+
+def convergence(ladder=(50, 100, 200, 400), pricer="option", method="explicit", stretch=None, Vol=.25, r=.05, Strike=100, Expiration=.5, spot=100, memory=True):
+    exact = float(blackscholes.price(spot, Strike, Expiration, r, Vol))
+    rows = []
+    #warm up so the first rung does not pay for the lazy scipy imports
+    price(pricer, ladder[0], method, stretch, Vol, r, Strike, Expiration)
+    for NAS in ladder:
+        start = time.perf_counter()
+        value = float(price(pricer, NAS, method, stretch, Vol, r, Strike, Expiration).value(spot))
+        seconds = time.perf_counter() - start
+
+        #a second solve under tracemalloc so the tracing does not slow down the timed one
+        peak = None
+        if memory:
+            tracemalloc.start()
+            price(pricer, NAS, method, stretch, Vol, r, Strike, Expiration)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        row = {"benchmark": "convergence", "pricer": pricer, "method": method, "stretch": stretch, "NAS": NAS, "value": value,
+                "exact": exact, "error": value - exact, "order": None, "richardson": None,
+                "richardsonError": None, "seconds": seconds, "peakBytes": peak}
+        if rows:
+            previous = rows[-1]
+            ratio = float(NAS) / previous["NAS"]
+            if previous["error"] != 0 and row["error"] != 0:
+                row["order"] = math.log(abs(previous["error"] / row["error"])) / math.log(ratio)
+            row["richardson"] = richardson(previous["value"], value, ratio)
+            row["richardsonError"] = row["richardson"] - exact
+        rows.append(row)
+    return rows
+
+def write(rows, out):
+    for row in rows:
+        out.write(json.dumps(row) + "\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convergence and timing ladder for the FDM pricers, as JSON lines")
+    parser.add_argument("--nas", type=int, nargs="+", default=[50, 100, 200, 400], help="grid sizes to run")
+    parser.add_argument("--pricer", choices=["option", "basket"], default="option")
+    parser.add_argument("--method", choices=["explicit", "implicit", "cn"], nargs="+", default=["explicit", "cn"])
+    parser.add_argument("--stretch", type=float, default=None, help="cluster the grid around the strike")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc peak memory solve")
+    parser.add_argument("--output", default=None, help="append to this file instead of stdout")
+    args = parser.parse_args()
+
+    out = open(args.output, "a") if args.output else sys.stdout
+    write([importTime()], out)
+    for method in args.method:
+        write(convergence(args.nas, args.pricer, method, args.stretch, memory=not args.no_memory), out)
+    if args.output:
+        out.close()
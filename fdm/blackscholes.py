@@ -0,0 +1,77 @@
+import numpy as np
+from scipy.special import ndtr
+
+#Black-Scholes prices, Greeks and implied volatility over whole arrays. Every argument broadcasts,
+#so a vector of strikes against one spot, or a strikes x expiries grid, prices in one call.
+#kind is "call" or "put", or an array of them for a mixed book.
+
+def d1d2(currentPrice, strikePrice, time, interestRate, impliedVol):
+    currentPrice, strikePrice, time, impliedVol = [np.asarray(x, dtype=float) for x in (currentPrice, strikePrice, time, impliedVol)]
+    volTime = impliedVol * np.sqrt(time)
+    d1 = (np.log(currentPrice / strikePrice) + (interestRate + impliedVol ** 2 / 2) * time) / volTime
+    return d1, d1 - volTime
+
+def density(x):
+    return np.exp(-x ** 2 / 2) / np.sqrt(2 * np.pi)
+
+def price(currentPrice, strikePrice, time, interestRate, impliedVol, kind="call"):
+    d1, d2 = d1d2(currentPrice, strikePrice, time, interestRate, impliedVol)
+    currentPrice = np.asarray(currentPrice, dtype=float)
+    discounted = np.asarray(strikePrice, dtype=float) * np.exp(-interestRate * np.asarray(time, dtype=float))
+    call = ndtr(d1) * currentPrice - ndtr(d2) * discounted
+    #put from put-call parity
+    return np.where(np.asarray(kind) == "call", call, call - currentPrice + discounted)
+
+def greeks(currentPrice, strikePrice, time, interestRate, impliedVol, kind="call"):
+    #returns [delta, gamma, vega, theta], vega per unit of vol and theta per year
+    d1, d2 = d1d2(currentPrice, strikePrice, time, interestRate, impliedVol)
+    isCall = np.asarray(kind) == "call"
+    currentPrice, time = np.asarray(currentPrice, dtype=float), np.asarray(time, dtype=float)
+    discounted = np.asarray(strikePrice, dtype=float) * np.exp(-interestRate * time)
+    pdf = density(d1)
+
+    delta = np.where(isCall, ndtr(d1), ndtr(d1) - 1)
+    gamma = pdf / (currentPrice * impliedVol * np.sqrt(time))
+    vega = currentPrice * pdf * np.sqrt(time)
+    decay = -currentPrice * pdf * impliedVol / (2 * np.sqrt(time))
+    theta = np.where(isCall, decay - interestRate * discounted * ndtr(d2), decay + interestRate * discounted * ndtr(-d2))
+    return [delta, gamma, vega, theta]
+
+def impliedVol(optionPrice, currentPrice, strikePrice, time, interestRate, kind="call", low=1e-4, high=5.0, tol=1e-10, maxIter=100):
+    #solves every quote at once: Newton steps kept inside a bisection bracket [low, high] that shrinks
+    #every iteration, so quotes where vega vanishes still converge. Quotes outside the no-arbitrage
+    #bounds, or needing a vol outside [low, high], come back as nan. tol is on the vol itself
+    optionPrice, currentPrice, strikePrice, time, kind = np.broadcast_arrays(
+            np.asarray(optionPrice, dtype=float), np.asarray(currentPrice, dtype=float),
+            np.asarray(strikePrice, dtype=float), np.asarray(time, dtype=float), np.asarray(kind))
+    shape = optionPrice.shape
+    optionPrice, currentPrice, strikePrice, time, kind = [x.ravel() for x in (optionPrice, currentPrice, strikePrice, time, kind)]
+    low = np.full(optionPrice.shape, low)
+    high = np.full(optionPrice.shape, high)
+    priceLow = price(currentPrice, strikePrice, time, interestRate, low, kind)
+    priceHigh = price(currentPrice, strikePrice, time, interestRate, high, kind)
+    valid = (optionPrice >= priceLow) & (optionPrice <= priceHigh)
+
+    vol = np.full(optionPrice.shape, 0.2)
+    #only the quotes that have not converged yet are repriced
+    active = np.flatnonzero(valid)
+    for i in range(maxIter):
+        if not active.size:
+            break
+        args = (currentPrice[active], strikePrice[active], time[active], interestRate, vol[active], kind[active])
+        error = price(*args) - optionPrice[active]
+        high[active] = np.where(error > 0, vol[active], high[active])
+        low[active] = np.where(error <= 0, vol[active], low[active])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            newton = vol[active] - error / greeks(*args)[2]
+        inside = (newton > low[active]) & (newton < high[active])
+        step = np.where(inside, newton, (low[active] + high[active]) / 2) - vol[active]
+        vol[active] += step
+        active = active[np.abs(step) > tol]
+
+    return np.where(valid, vol, np.nan).reshape(shape)
+
+def volBand(optionPrice, currentPrice, strikePrice, time, interestRate, kind="call"):
+    #[Vol_L, Vol_H] for the uncertain volatility pricers: the range of the quotes' implied vols
+    vols = impliedVol(optionPrice, currentPrice, strikePrice, time, interestRate, kind)
+    return [np.nanmin(vols), np.nanmax(vols)]
@@ -0,0 +1,108 @@
+import os
+import numpy as np
+
+#Columnar output for FDM results. A Result becomes one row per (scenario, node) with the columns
+#scenario, assetPrice, payoff, value plus one column per scenario parameter, written in bulk as a
+#compressed .npz (default) or as CSV. append() adds a batch to a growing output during a sweep:
+#for npz the path is a directory of part-00000.npz, part-00001.npz, ..., for CSV one file.
+#Scenarios are numbered on from the ones already in the output so they stay unique across batches.
+
+def columns(result, params=None, first=0):
+    #params maps a name to a scalar, or to one value per scenario for basketBatch results.
+    #Scenarios are numbered from first
+    assetPrices, payoff, value = result[0], np.asarray(result[1]), np.asarray(result[2])
+    value = value.reshape(-1, len(assetPrices))
+    payoff = np.broadcast_to(payoff, value.shape)
+    scenarios, NAS = value.shape
+
+    table = {"scenario": np.repeat(np.arange(first, first + scenarios), NAS),
+            "assetPrice": np.tile(assetPrices, scenarios),
+            "payoff": payoff.ravel(),
+            "value": value.ravel()}
+    for name, param in (params or {}).items():
+        param = np.asarray(param)
+        if param.ndim == 0:
+            table[name] = np.full(scenarios * NAS, param)
+        else:
+            table[name] = np.repeat(param, NAS)
+    return table
+
+def formatOf(path, format=None):
+    if format is not None:
+        return format
+    return "csv" if path.endswith(".csv") else "npz"
+
+def write(path, result, params=None, format=None):
+    table = columns(result, params)
+    if formatOf(path, format) == "csv":
+        writeCsv(path, table, "w")
+    else:
+        np.savez_compressed(path, **table)
+
+def append(path, result, params=None, format=None):
+    csv = formatOf(path, format) == "csv"
+    table = columns(result, params, nextScenario(path, csv))
+    if csv:
+        writeCsv(path, table, "a")
+        return
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    np.savez_compressed(os.path.join(path, "part-%05d.npz" % len(parts(path))), **table)
+
+def parts(path):
+    return sorted(name for name in os.listdir(path) if name.startswith("part-"))
+
+def nextScenario(path, csv):
+    #one past the last scenario already written to path, 0 for a new output
+    if csv:
+        if not os.path.exists(path):
+            return 0
+        with open(path, "rb") as f:
+            #the last row is all that is needed, read back from the end until it is complete
+            size = f.seek(0, os.SEEK_END)
+            chunk = 4096
+            while True:
+                f.seek(max(0, size - chunk))
+                lines = f.read().splitlines()
+                if len(lines) > 1 or chunk >= size:
+                    break
+                chunk *= 2
+        if not lines or lines[-1].startswith(b"scenario"):
+            return 0
+        return int(float(lines[-1].split(b",")[0])) + 1
+    if not os.path.isdir(path) or not parts(path):
+        return 0
+    with np.load(os.path.join(path, parts(path)[-1])) as stored:
+        return int(stored["scenario"][-1]) + 1
+
+def writeCsv(path, table, mode):
+    #numbers keep full precision, anything else (a method name, an option type) is written as text
+    header = ",".join(table) if mode == "w" or not os.path.exists(path) else ""
+    formats = []
+    for name in table:
+        if table[name].dtype.kind in "biuf":
+            formats.append("%.17g")
+        elif any("," in str(item) or "\n" in str(item) for item in np.unique(table[name])):
+            raise ValueError("CSV column " + name + " has a value with a comma or line break")
+        else:
+            formats.append("%s")
+    if formats.count("%s"):
+        rows = np.empty((len(table["scenario"]), len(table)), dtype=object)
+        for column, name in enumerate(table):
+            rows[:, column] = table[name]
+    else:
+        rows = np.column_stack([table[name] for name in table])
+    with open(path, mode) as f:
+        np.savetxt(f, rows, delimiter=",", fmt=formats, header=header, comments="")
+
+def read(path):
+    #the columns back as a dict of arrays, all parts of a directory concatenated
+    if os.path.isdir(path):
+        tables = [read(os.path.join(path, name)) for name in parts(path)]
+        return dict((name, np.concatenate([table[name] for table in tables])) for name in tables[0])
+    if path.endswith(".csv"):
+        #each column's type is inferred, so text columns come back as strings
+        data = np.genfromtxt(path, delimiter=",", names=True, dtype=None, encoding=None)
+        return dict((name, data[name]) for name in data.dtype.names)
+    with np.load(path) as stored:
+        return dict((name, stored[name]) for name in stored.files)
@@ -1,117 +1,391 @@
+import argparse
 import math
-import csv
+import itertools
+import hashlib
+import inspect
+import os
+from collections import OrderedDict
+import numpy as np
+
+#scipy, the process pool and blackscholes are imported where they are used so that importing the
+#pricers stays cheap; python fdm.py runs the scenario analysis in main()
 
 #FDM pricing methods for vanilla and binary options
 
-def basket(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, Expiration, NAS, weight1, weight2, binaryPos):
-    ds = 2 * highStrike / NAS   
-    dt = 0.9 / Vol_H ** 2 / NAS ** 2
-    NTS = int(Expiration/dt) + 1
-    dt = Expiration/NTS
-    assetPrices = [0]*NAS
-    payoff = [0]*NAS
-    vold = [0]*NAS
-    vnew = [0]*NAS
-    value = [0]*NAS
-    heaviside = lambda x, y: 1 if x > y else 0 
+def heaviside(x, y):
+    return np.greater(x, y) * 1.0
+
+def assetGrid(NAS, Smax, centers=(), stretch=None):
+    #NAS nodes from 0 up to (NAS - 1) * Smax / NAS. Uniform by default, with stretch the nodes are
+    #clustered around centers (strikes, spot) at equal steps of sum(asinh((S - c) / stretch)),
+    #so the spacing is about stretch near a center and grows away from it
+    ds = Smax / float(NAS)
+    if stretch is None or not len(centers):
+        return np.arange(NAS) * ds
+    fine = np.linspace(0, (NAS - 1) * ds, 64 * NAS)
+    xi = sum(np.arcsinh((fine - c) / float(stretch)) for c in centers)
+    assetPrices = np.interp(np.linspace(xi[0], xi[-1], NAS), xi, fine)
+    assetPrices[0], assetPrices[-1] = 0.0, fine[-1]
+    return assetPrices
+
+def stencil(assetPrices):
+    #weights of the three point Delta and Gamma at the interior nodes of any grid, in terms of
+    #up = V[j+1] - V[j] and down = V[j] - V[j-1]: Delta = A up + B down, Gamma = C up - D down.
+    #On a uniform grid A = B = 1 / (2 ds) and C = D = 1 / ds^2
+    hm = np.diff(assetPrices)[:-1]
+    hp = np.diff(assetPrices)[1:]
+    A = hm / (hp * (hm + hp))
+    B = hp / (hm * (hm + hp))
+    C = 2 / (hp * (hm + hp))
+    D = 2 / (hm * (hm + hp))
+    return A, B, C, D
 
-    for i in range(NAS):
-        assetPrices[i] = i * ds
-        payoff[i] = ( binaryPos * heaviside(assetPrices[i], bStrike) + weight1 * max(assetPrices[i] - lowStrike, 0) + weight2 * max(assetPrices[i] - highStrike, 0)) * 1000
-        vold[i] = payoff[i]
+def extrapolation(assetPrices):
+    #q in the linear top boundary V[N-1] = (1 + q) V[N-2] - q V[N-3]
+    return (assetPrices[-1] - assetPrices[-2]) / (assetPrices[-2] - assetPrices[-3])
+
+def march(vold, assetPrices, dt, NTS, Vol_H, Vol_L, r, follow=False, record=None):
+    #explicit time march on the last axis of vold, so a 2-D (scenarios, NAS) state marches every row at once.
+    #record(step, v) is called with the payoff as step 0 and after every step
+    vold = np.array(vold, dtype=float)
+    vnew = np.empty_like(vold)
+    S = assetPrices[1:-1]
+    A, B, C, D = stencil(assetPrices)
+    q = extrapolation(assetPrices)
+    discount = 1 - r * dt
+
+    #V[j] * discount + up * P + down * Q is the whole update. P and Q are Vol_H's, and where Gamma =
+    #C up - D down >= 0 Vol_L adds k Gamma, k the difference of the two diffusion coefficients,
+    #so the volatility choice is max(|k| Gamma, 0) taken with the sign of k.
+    #The weights are zero at S = 0, so node 0 (which only discounts) goes through the same products
+    #as the interior, and a step allocates nothing
+    diffusion = 0.5 * (Vol_H * S) ** 2
+    P = dt * (r * S * A + diffusion * C)
+    Q = dt * (r * S * B - diffusion * D)
+    k = np.abs(dt * 0.5 * (Vol_L ** 2 - Vol_H ** 2) * S ** 2)
+    lowered = Vol_L < Vol_H
+    top = np.array([-q, 1 + q])
+    #up [|k| C, P] - down [|k| D, -Q] is [|k| Gamma, up * P + down * Q] at every node but the last
+    upWeights = np.zeros((2,) + (1,) * (vold.ndim - 1) + (len(assetPrices) - 1,))
+    downWeights = np.zeros_like(upWeights)
+    upWeights[0, ..., 1:] = k * C
+    upWeights[1, ..., 1:] = P
+    downWeights[0, ..., 1:] = k * D
+    downWeights[1, ..., 1:] = -Q
+    #the differences between neighbours, up is the one above each node and down the one below,
+    #which stays 0 for node 0
+    differences = np.zeros_like(vold)
+    up = differences[..., 1:]
+    down = differences[..., :-1]
+    products = np.empty((2,) + up.shape)
+    term = np.empty_like(products)
+    gamma, update = products
+    if follow:
+        Long = np.empty(gamma[..., :1, :].shape, dtype=bool)
+    #every node above the first, every node below the last, the two before the last and the last,
+    #for both buffers so swapping them needs no slicing
+    views = [(v[..., 1:], v[..., :-1], v[..., -3:-1], v[..., -1]) for v in (vold, vnew)]
+    if record is not None:
+        record(0, vold)
 
     for i in range(NTS):
-        for j in range(NAS - 1):
-            Delta = (vold[j + 1] - vold[j - 1]) / (2 * ds)
-            Gamma = (vold[j + 1] - 2 * vold[j] + vold[j - 1]) / (ds ** 2)
-
-            if Gamma >= 0:
-                Vol = Vol_L
-            else: 
-                Vol = Vol_H
-
-            Theta = r * vold[j] - 0.5 * (Vol * assetPrices[j]) ** 2 * Gamma - r * assetPrices[j] * Delta
-            vnew[j] = vold[j] - Theta * dt
-
-        vnew[0] = vold[0] * (1 - r * dt)
-        vnew[NAS - 1] = 2 * vnew[NAS - 2] - vnew[NAS - 3]
-        for j in range(NAS):
-            vold[j] = vnew[j]
-
-    for i in range(NAS):
-        value[i] = vold[i]
-        value[i] = value[i] / 1000.0
-        payoff[i] = payoff[i] / 1000.0
-
-    return [assetPrices, payoff, value]
-
-def option(Vol_H, Vol_L, r, Option_Type, Strike, Expiration, NAS, position):
-    ds = 2 * Strike / NAS               #inf
-    dt = 0.9 / Vol_H ** 2 / NAS ** 2    #stability
-    NTS = int(Expiration/dt) + 1
-    dt = Expiration/NTS
-    assetPrices = [0]*NAS
-    payoff = [0]*NAS
-    vold = [0]*NAS
-    vnew = [0]*NAS
-    value = [0]*NAS
-    heaviside = lambda x, y: 1 if x > y else 0 #if y < x else 0.5
-
-    for i in range(NAS):
-        assetPrices[i] = i * ds
-        if Option_Type == "call":
-            payoff[i] = max(assetPrices[i] - Strike, 0) * 1000
-        elif Option_Type == "put":
-            payoff[i] = max(Strike - assetPrices[i], 0) * 1000
-        elif Option_Type == "binary":
-            payoff[i] = heaviside(assetPrices[i], Strike) * 1000 * position
+        (upper, lower, _, _), (_, center, tail, last) = views
+        np.subtract(upper, lower, out=up)
+        np.multiply(up, upWeights, out=products)
+        np.multiply(down, downWeights, out=term)
+        products -= term
+
+        #Vol_L where Gamma >= 0, Vol_H otherwise
+        if follow:
+            np.greater_equal(gamma[..., :1, :], 0, out=Long)
+            gamma *= Long
         else:
-            print "Option_Type unrecognized"
-        vold[i] = payoff[i]
+            np.maximum(gamma, 0, out=gamma)
+
+        np.multiply(lower, discount, out=center)
+        center += update
+        if lowered:
+            center -= gamma
+        else:
+            center += gamma
+        np.matmul(tail, top, out=last)
+        views.reverse()
+        vold, vnew = vnew, vold
+        if record is not None:
+            record(i + 1, vold)
+
+    return vold
+
+def longGamma(v, C, D, tol=0.0, follow=False):
+    #True where Gamma >= 0 (or within -tol of it), which is where the worst case is Vol_L
+    mask = (v[..., 2:] - v[..., 1:-1]) * C - (v[..., 1:-1] - v[..., :-2]) * D >= -tol
+    if follow:
+        return np.broadcast_to(mask[..., :1, :], mask.shape)
+    return mask
+
+def bandedSolve(lower, diag, upper, rhs, q, ab=None):
+    #solves the tridiagonal system of every row along the last axis in one banded solve, the bands
+    #never cross rows. The last row is the linear top boundary V[N-1] - (1 + q) V[N-2] + q V[N-3] = 0,
+    #its V[N-3] term is eliminated against row N-2 here so the system stays tridiagonal, which
+    #overwrites the last entries of the bands and rhs. ab is an optional (3, rhs.size) work array
+    from scipy.linalg import solve_banded
+    f = q / lower[..., -2]
+    lower[..., -1] = -(1 + q) - diag[..., -2] * f
+    diag[..., -1] = 1 - upper[..., -2] * f
+    upper[..., -1] = 0
+    rhs[..., -1] = -rhs[..., -2] * f
+    if ab is None:
+        ab = np.zeros((3, rhs.size))
+    ab[0, 1:] = upper.reshape(-1)[:-1]
+    ab[1] = diag.reshape(-1)
+    ab[2, :-1] = lower.reshape(-1)[1:]
+    return solve_banded((1, 1), ab, rhs.reshape(-1), check_finite=False).reshape(rhs.shape)
+
+def implicitMarch(vold, assetPrices, dt, NTS, Vol_H, Vol_L, r, theta, smoothing=2, maxIter=20, tol=1e-10, follow=False, record=None):
+    #theta = 1 is fully implicit, theta = 0.5 is Crank-Nicolson with the first smoothing steps fully implicit
+    #to damp the payoff kinks. The Gamma-sign volatility is found by policy iteration at each step.
+    #with follow the rows after the first use the first row's volatility, see timeMarch; record as in march
+    vold = np.array(vold, dtype=float)
+    shape = vold.shape
+    S = assetPrices[1:-1]
+    A, B, C, D = stencil(assetPrices)
+    q = extrapolation(assetPrices)
+
+    def coefficients(mask):
+        diffusion = 0.5 * np.where(mask, Vol_L ** 2, Vol_H ** 2) * S ** 2
+        return diffusion * D - r * S * B, -diffusion * (C + D) + r * S * (B - A) - r, diffusion * C + r * S * A
+
+    #rows of the banded system: V_0 only discounts, the last row is the linear boundary, see bandedSolve
+    lower, diag, upper = np.zeros((3,) + shape)
+    ab = np.zeros((3, vold.size))
+    rhs = np.zeros(shape)
+    if record is not None:
+        record(0, vold)
 
     for i in range(NTS):
-        for j in range(NAS - 1):
-            Delta = (vold[j + 1] - vold[j - 1]) / (2 * ds)
-            Gamma = (vold[j + 1] - 2 * vold[j] + vold[j - 1]) / (ds ** 2)
+        th = 1.0 if i < smoothing else theta
+        #Gamma below roundoff of the value counts as Gamma = 0 so the policy cannot flip on noise
+        noise = 1e-12 * max(1.0, np.max(np.abs(vold))) * np.max(C)
+        mask = longGamma(vold, C, D, noise, follow)
+        rhs[..., 1:-1] = vold[..., 1:-1]
+        if th < 1:
+            a, b, c = coefficients(mask)
+            rhs[..., 1:-1] += (1 - th) * dt * (a * vold[..., :-2] + b * vold[..., 1:-1] + c * vold[..., 2:])
+        rhs[..., 0] = vold[..., 0] * (1 - (1 - th) * r * dt)
+        diag[..., 0] = 1 + th * r * dt
 
-            if Gamma >= 0:
-                Vol = Vol_L
-            else: 
-                Vol = Vol_H
+        vprev = None
+        for k in range(maxIter):
+            a, b, c = coefficients(mask)
+            lower[..., 1:-1] = -th * dt * a
+            diag[..., 1:-1] = 1 - th * dt * b
+            upper[..., 1:-1] = -th * dt * c
+            vnew = bandedSolve(lower, diag, upper, rhs, q, ab)
+            newMask = longGamma(vnew, C, D, noise, follow)
+            #stop once the policy is fixed or no longer moves the value
+            if np.array_equal(newMask, mask) or (vprev is not None and np.max(np.abs(vnew - vprev)) <= tol * max(1.0, np.max(np.abs(vnew)))):
+                break
+            mask = newMask
+            vprev = vnew
+        vold = vnew
+        if record is not None:
+            record(i + 1, vold)
 
-            Theta = r * vold[j] - 0.5 * (Vol * assetPrices[j]) ** 2 * Gamma - r * assetPrices[j] * Delta
-            vnew[j] = vold[j] - Theta * dt
+    return vold
 
-        vnew[0] = vold[0] * (1 - r * dt)
-        vnew[NAS - 1] = 2 * vnew[NAS - 2] - vnew[NAS - 3]
-        for j in range(NAS):
-            vold[j] = vnew[j]
+def timeMarch(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method="explicit", NTS=None, follow=False, record=None):
+    #method is "explicit", "implicit" or "cn". The explicit scheme needs dt under its stability limit
+    #(a smaller NTS raises ValueError), the implicit ones default to NAS / 2 steps since dt is only bounded by accuracy.
+    #With follow every row of a 2-D payoff takes the Vol_L/Vol_H choice of row 0, which makes the march
+    #linear in the other rows: they come out as the derivatives of row 0's value along their payoffs.
+    #record is a Surfaces to fill at its snapshot times, or None
+    NAS = len(assetPrices)
+    if method == "explicit":
+        #0.9 / Vol^2 / NAS^2 on the uniform grid, the smallest relative spacing on a clustered one, for the
+        #larger of the two vols whichever way round they are given
+        h = np.minimum(np.diff(assetPrices)[:-1], np.diff(assetPrices)[1:]) / assetPrices[1:-1]
+        dt = 0.9 / max(Vol_H, Vol_L) ** 2 * min(np.min(h) ** 2, 1.0 / NAS ** 2)    #stability
+        stable = int(Expiration/dt) + 1
+        if NTS is None:
+            NTS = stable
+        elif NTS < stable:
+            #fewer steps blow up instead of losing accuracy
+            raise ValueError("explicit scheme needs NTS >= " + str(stable) + " for stability, got " + str(NTS))
+    elif NTS is None:
+        NTS = NAS // 2 + 1
+    dt = Expiration/float(NTS)
+    if record is not None:
+        record.start(assetPrices, np.shape(payoff), dt, NTS)
 
-    for i in range(NAS):
-        value[i] = vold[i]
-        value[i] = value[i] / 1000.0
-        payoff[i] = payoff[i] / 1000.0
+    if method == "explicit":
+        return march(payoff, assetPrices, dt, NTS, Vol_H, Vol_L, r, follow, record)
+    elif method == "implicit":
+        return implicitMarch(payoff, assetPrices, dt, NTS, Vol_H, Vol_L, r, 1.0, follow=follow, record=record)
+    elif method == "cn":
+        return implicitMarch(payoff, assetPrices, dt, NTS, Vol_H, Vol_L, r, 0.5, follow=follow, record=record)
+    raise ValueError("method unrecognized: " + str(method))
 
-    return [assetPrices, payoff, value]
+def nodeGreeks(assetPrices, value):
+    #Delta and Gamma at every node from the solver's stencil, the end nodes copy their neighbours
+    A, B, C, D = stencil(assetPrices)
+    up = value[..., 2:] - value[..., 1:-1]
+    down = value[..., 1:-1] - value[..., :-2]
+    delta = np.empty_like(value)
+    gamma = np.empty_like(value)
+    delta[..., 1:-1] = A * up + B * down
+    gamma[..., 1:-1] = C * up - D * down
+    for nodes in (delta, gamma):
+        nodes[..., 0] = nodes[..., 1]
+        nodes[..., -1] = nodes[..., -2]
+    return delta, gamma
 
-def BlackScholes(currentPrice, strikePrice, time, interestRate, impliedVol):
+class Surfaces(object):
+    #value, Delta and Gamma recorded at chosen times to expiry during one march, into arrays of shape
+    #(snapshots,) + value shape allocated once the grid is known. With store they are .npy files
+    #opened as memory maps (store + "_value.npy" and so on), so only the current time level is in RAM.
+    #The times actually recorded are the nearest time steps, in increasing order, in .times
+
+    def __init__(self, snapshots, store=None, unit=1.0):
+        self.snapshots = snapshots
+        self.store = store
+        self.unit = unit
+
+    def start(self, assetPrices, shape, dt, NTS):
+        self.assetPrices = assetPrices
+        steps = sorted(set(min(NTS, max(0, int(round(t / dt)))) for t in self.snapshots))
+        self.slots = dict((step, k) for k, step in enumerate(steps))
+        self.times = np.array(steps) * dt
+        shape = (len(steps),) + tuple(shape)
+        if self.store is None:
+            self.value, self.delta, self.gamma = [np.empty(shape) for name in ("value", "delta", "gamma")]
+        else:
+            np.save(self.store + "_time.npy", self.times)
+            self.value, self.delta, self.gamma = [np.lib.format.open_memmap(self.store + "_" + name + ".npy", mode="w+", shape=shape)
+                    for name in ("value", "delta", "gamma")]
+
+    def __call__(self, step, v):
+        if step in self.slots:
+            k = self.slots[step]
+            self.value[k] = v / self.unit
+            self.delta[k], self.gamma[k] = nodeGreeks(self.assetPrices, self.value[k])
+
+    def flush(self):
+        for surface in (self.value, self.delta, self.gamma):
+            if isinstance(surface, np.memmap):
+                surface.flush()
+
+class Result(list):
+    #[assetPrices, payoff, value] as option/basket return it, with O(1) lookups on the uniform grid
+    #(a binary search on a clustered one). value (and payoff) may be 2-D from basketBatch, lookups
+    #then work along the last axis. surfaces holds the Surfaces when snapshots were asked for
+
+    def __init__(self, assetPrices, payoff, value, surfaces=None):
+        list.__init__(self, [assetPrices, payoff, value])
+        self.ds = assetPrices[1] - assetPrices[0]
+        self.uniform = np.allclose(np.diff(assetPrices), self.ds)
+        self.surfaces = surfaces
+
+    def delta(self, spots, order=3):
+        return self.interpolate(nodeGreeks(self[0], self[2])[0], spots, order)
+
+    def gamma(self, spots, order=3):
+        return self.interpolate(nodeGreeks(self[0], self[2])[1], spots, order)
+
+    def value(self, spots, order=3):
+        #order 1, 2 or 3 is linear, quadratic or cubic Lagrange interpolation, exact on the nodes
+        return self.interpolate(self[2], spots, order)
+
+    def interpolate(self, nodes, spots, order=3):
+        assetPrices = self[0]
+        spots = np.asarray(spots, dtype=float)
+        last = len(assetPrices) - 1
+        if self.uniform:
+            left = np.floor(spots / self.ds).astype(int)
+        else:
+            left = np.searchsorted(assetPrices, spots, side="right") - 1
+        if order == 1:
+            first = np.clip(left, 0, last - 1)
+        elif order == 2:
+            #the three nodes around the nearest one
+            left = np.clip(left, 0, last - 1)
+            nearer = spots - assetPrices[left] > assetPrices[left + 1] - spots
+            first = np.clip(left + nearer - 1, 0, last - 2)
+        elif order == 3:
+            first = np.clip(left - 1, 0, last - 3)
+        else:
+            raise ValueError("order must be 1, 2 or 3")
+
+        total = 0
+        for k in range(order + 1):
+            weight = 1.0
+            for m in range(order + 1):
+                if m != k:
+                    weight = weight * (spots - assetPrices[first + m]) / (assetPrices[first + k] - assetPrices[first + m])
+            total = total + weight * nodes[..., first + k]
+        return total
 
-        #Convert all numbers to float
-        (strikePrice, time, interestRate, impliedVol) = (float(strikePrice), float(time), float(interestRate), float(impliedVol))
-        #Find d1 and d2(currentPrice, strikePrice, time, interestRate, impliedVol)
-        d1 = (math.log(currentPrice / strikePrice) + (interestRate + impliedVol**2 / 2)*time) / (math.sqrt(time)*impliedVol)
-        d2 = (math.log(currentPrice / strikePrice) + (interestRate - impliedVol**2 / 2)*time) / (math.sqrt(time)*impliedVol)
-        
-        return cdf(d1)*currentPrice - cdf(d2)*strikePrice*math.exp(-interestRate*time)
+def solve(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, snapshots=None, store=None):
+    #marches a payoff in the pricers' units of 1000 and wraps it up as a Result
+    surfaces = None
+    if snapshots is not None:
+        surfaces = Surfaces(snapshots, store, 1000.0)
+    value = timeMarch(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, record=surfaces)
+    if surfaces is not None:
+        surfaces.flush()
+    return Result(assetPrices, payoff / 1000.0, value / 1000.0, surfaces)
+
+def basketPayoff(assetPrices, bStrike, lowStrike, highStrike, weight1, weight2, binaryPos):
+    return ( binaryPos * heaviside(assetPrices, bStrike) + weight1 * np.maximum(assetPrices - lowStrike, 0) + weight2 * np.maximum(assetPrices - highStrike, 0)) * 1000
+
+def basket(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, Expiration, NAS, weight1, weight2, binaryPos, method="explicit", NTS=None, stretch=None, snapshots=None, store=None):
+    #stretch clusters the grid around the three strikes, see assetGrid
+    assetPrices = assetGrid(NAS, 2 * highStrike, (bStrike, lowStrike, highStrike), stretch)
+    payoff = basketPayoff(assetPrices, bStrike, lowStrike, highStrike, weight1, weight2, binaryPos)
+
+    return solve(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, snapshots, store)
+
+def basketBatch(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, Expiration, NAS, weights1, weights2, binaryPos, method="explicit", NTS=None, stretch=None, snapshots=None, store=None):
+    #same as basket for arrays of weights, all scenarios march together as one (scenarios, NAS) state
+    #so payoff[k] and value[k] are the basket for weights1[k], weights2[k]
+    assetPrices = assetGrid(NAS, 2 * highStrike, (bStrike, lowStrike, highStrike), stretch)
+    weights1 = np.asarray(weights1, dtype=float).reshape(-1, 1)
+    weights2 = np.asarray(weights2, dtype=float).reshape(-1, 1)
+    payoff = basketPayoff(assetPrices, bStrike, lowStrike, highStrike, weights1, weights2, binaryPos)
+
+    return solve(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, snapshots, store)
+
+def option(Vol_H, Vol_L, r, Option_Type, Strike, Expiration, NAS, position, method="explicit", NTS=None, stretch=None, snapshots=None, store=None):
+    #snapshots is a list of times to expiry to record the value, Delta and Gamma surfaces at into
+    #result.surfaces, store a path prefix to write them to memory mapped .npy files instead of RAM
+    assetPrices = assetGrid(NAS, 2 * Strike, (Strike,), stretch)    #inf at 2 * Strike
+
+    if Option_Type == "call":
+        payoff = np.maximum(assetPrices - Strike, 0) * 1000
+    elif Option_Type == "put":
+        payoff = np.maximum(Strike - assetPrices, 0) * 1000
+    elif Option_Type == "binary":
+        payoff = heaviside(assetPrices, Strike) * 1000 * position
+    else:
+        print("Option_Type unrecognized")
+        payoff = np.zeros(NAS)
+
+    return solve(payoff, assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, snapshots, store)
+
+def BlackScholes(currentPrice, strikePrice, time, interestRate, impliedVol):
+    #call price, takes arrays as well; see blackscholes for puts, Greeks and implied vols
+    import blackscholes
+    return blackscholes.price(currentPrice, strikePrice, time, interestRate, impliedVol)[()]
 
 
 def cdf(x): 
     return (1.0 + math.erf(x / math.sqrt(2.0))) / 2.0
 
 def findValue(arrays, value):
-    for i in range(len(arrays[0])):
-        if arrays[0][i] == value:
-            return arrays[2][i]
+    #value at a spot, interpolated when it is not on a node
+    if not isinstance(arrays, Result):
+        #plain [assetPrices, payoff, value] lists as well as arrays
+        arrays = Result(*[np.asarray(array, dtype=float) for array in arrays])
+    return arrays.value(value)
 
 def payout(bStrike, lowStrike, highStrike, weight1, weight2, binaryPos):
     heaviside = lambda x, y: 1 if x > y else 0 
@@ -120,41 +394,183 @@ def payout(bStrike, lowStrike, highStrike, weight1, weight2, binaryPos):
     for i in range(0, 200, 1):
         payoff.append(( binaryPos*heaviside(i, bStrike) + weight1 * max(i - lowStrike, 0) + weight2 * max(i - highStrike, 0)))
     return payoff
-    
-lowerOption = BlackScholes(100, 90, .5, .05, .25)
-higherOption = BlackScholes(100, 110, .5, .05, .25)
-
-realLower = 14.81
-realHigher = 4.94
-
-minimum = [100, 100, 100]
-maximum = [-5, -5, -5]
-for i in range(-10, 10): #-10, 0
-    for j in range(-10, 10): #1, 10
-        baskets = basket(.3, .2, .05, 100, 90, 110, .5, 200, i/100.0, j/100.0, -1) 
-        value = findValue(baskets, 100) - i/100.0 * lowerOption - j/100.0 * higherOption
-        if(abs(minimum[2]) > abs(findValue(baskets, 100))): #and findValue(baskets, 80) < .001):
-            #str(findValue(baskets, 100))
-            minimum[0] = i
-            minimum[1] = j
-            minimum[2] = findValue(baskets, 100)
-        if(maximum[2] < value):
-            print "i: " + str(i) + " j: " + str(j) + "baskets: " + str(value)
-            maximum[0] = i
-            maximum[1] = j
-            maximum[2] = value
-
-print "MIN: Lambda1 = " + str(minimum[0]) + " Lambda2: " + str(minimum[1]) + " Value: " + str(minimum[2]) 
-print "MAX: Lambda1 = " + str(maximum[0]) + " Lambda2: " + str(maximum[1]) + " Value: " + str(maximum[2])
-print "Backed binary: " + str(minimum[2] - minimum[0]/100.0*lowerOption - minimum[1]/100.0*higherOption)
-
-binary = option(.3, .2, .05, "binary", 100, .5, 200, -1)
-what2 = basket(.3, .2, .05, 100, 90, 110, .5, 200, -.05, .05, 1)
-print "backed binary: " + str(findValue(what2, 100) + .05* lowerOption - .05*higherOption)
-what = payout(100, 90, 110, .06, -.06, -1)
-with open("output.csv", "wb") as csvfile:
-    spamwriter = csv.writer(csvfile, delimiter=",")
-    for x in range(len(what)): #FIXME: what[0]
-        spamwriter.writerow([str(x)] + [str(what[x])] + [what2[2][x]])
-        #spamwriter.writerow([str(what[0][x])] + [str(what[2][x])])
 
+class SolveLimit(Exception):
+    #stops hedgeWeights' search once it has used its solves
+    pass
+
+def hedgeWeights(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, Expiration, NAS, binaryPos, lowerPrice, higherPrice, spot, start=(0.0, 0.0), bounds=None, maxSolves=30, method="cn", NTS=None):
+    #continuous search for the weight1, weight2 that maximize the hedged binary value at spot,
+    #the basket value less weight1 * lowerPrice + weight2 * higherPrice.
+    #Each solve marches the basket together with its two call legs under the basket's volatility choice,
+    #so the gradient comes out of the same march and L-BFGS-B needs far fewer solves than a grid.
+    #maxSolves is a hard cap on the solves, line search ones included: the search stops at the cap and
+    #the best weights solved so far are returned.
+    #returns [weight1, weight2, value, solves]
+    from scipy.optimize import minimize
+    assetPrices = assetGrid(NAS, 2 * highStrike)
+    legs = [np.maximum(assetPrices - lowStrike, 0) * 1000, np.maximum(assetPrices - highStrike, 0) * 1000]
+    solves = [0]
+    best = [np.array(start, dtype=float), np.inf]
+
+    def hedged(weights):
+        if solves[0] >= maxSolves:
+            raise SolveLimit()
+        solves[0] += 1
+        payoff = basketPayoff(assetPrices, bStrike, lowStrike, highStrike, weights[0], weights[1], binaryPos)
+        value = timeMarch(np.array([payoff] + legs), assetPrices, Expiration, Vol_H, Vol_L, r, method, NTS, True) / 1000.0
+        atSpot = Result(assetPrices, payoff, value).value(spot)
+        loss = -(atSpot[0] - weights[0] * lowerPrice - weights[1] * higherPrice)
+        if loss < best[1]:
+            best[0], best[1] = np.array(weights, dtype=float), loss
+        return loss, -np.array([atSpot[1] - lowerPrice, atSpot[2] - higherPrice])
+
+    try:
+        minimize(hedged, np.array(start, dtype=float), jac=True, method="L-BFGS-B", bounds=bounds, options={"maxfun": maxSolves})
+    except SolveLimit:
+        pass
+    return [best[0][0], best[0][1], -best[1], solves[0]]
+
+def callPricer(pricer, params):
+    return pricer(**params)
+
+def sweep(pricer, base, grid, workers=None, ordered=True):
+    #prices every combination of the values in grid (name -> list of values) on top of the fixed
+    #keyword arguments in base, e.g. sweep(basket, {...}, {"weight1": [...], "Vol_H": [...]}),
+    #spreading the solves over a process pool of workers (default: one per core).
+    #Yields (params, result) as solves finish: in grid order when ordered, else in completion order.
+    #pricer has to be a module level function such as option or basket so it can be pickled.
+    from concurrent.futures import ProcessPoolExecutor, as_completed
+    names = list(grid)
+    combos = [dict(zip(names, values)) for values in itertools.product(*[grid[name] for name in names])]
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {}
+        for index, combo in enumerate(combos):
+            params = dict(base)
+            params.update(combo)
+            futures[pool.submit(callPricer, pricer, params)] = index
+
+        done = {}
+        nextIndex = 0
+        for future in as_completed(futures):
+            index = futures[future]
+            if not ordered:
+                yield combos[index], future.result()
+                continue
+            done[index] = future.result()
+            while nextIndex in done:
+                yield combos[nextIndex], done.pop(nextIndex)
+                nextIndex += 1
+
+def cached(pricer, maxsize=128, directory=None):
+    #memoizes option/basket style pricers on their normalized arguments: defaults filled in and numbers
+    #as floats, so option(.3, .2, .05, "call", 100, .5, 200, 1) and Strike=100.0 share an entry.
+    #Keeps the maxsize most recently used results in memory and, with directory, also stores every
+    #solve there as a compressed .npz that later runs load instead of solving again.
+    #Results come back as a Result of read-only arrays since they are shared between callers.
+    signature = inspect.signature(pricer)
+    memory = OrderedDict()
+    stats = {"hits": 0, "disk": 0, "misses": 0}
+
+    def normalize(args, kwargs):
+        bound = signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        key = [pricer.__name__]
+        for name, value in bound.arguments.items():
+            if isinstance(value, (int, float, np.number)) and not isinstance(value, bool):
+                value = float(value)
+            elif isinstance(value, (list, tuple, np.ndarray)):
+                value = tuple(np.asarray(value, dtype=float).ravel())
+            key.append((name, value))
+        return tuple(key)
+
+    def wrapper(*args, **kwargs):
+        key = normalize(args, kwargs)
+        if dict(key[1:]).get("snapshots") is not None:
+            #surfaces are not cached
+            return pricer(*args, **kwargs)
+        if key in memory:
+            memory.move_to_end(key)
+            stats["hits"] += 1
+            return Result(*memory[key])
+
+        path = None
+        result = None
+        if directory is not None:
+            path = os.path.join(directory, hashlib.sha1(repr(key).encode()).hexdigest() + ".npz")
+            if os.path.exists(path):
+                with np.load(path) as stored:
+                    result = [stored["assetPrices"], stored["payoff"], stored["value"]]
+                stats["disk"] += 1
+        if result is None:
+            result = [np.asarray(array) for array in pricer(*args, **kwargs)]
+            stats["misses"] += 1
+            if path is not None:
+                if not os.path.isdir(directory):
+                    os.makedirs(directory)
+                np.savez_compressed(path, assetPrices=result[0], payoff=result[1], value=result[2])
+
+        for array in result:
+            array.setflags(write=False)
+        memory[key] = result
+        if len(memory) > maxsize:
+            memory.popitem(last=False)
+        return Result(*result)
+
+    wrapper.stats = stats
+    wrapper.clear = memory.clear
+    wrapper.__name__ = pricer.__name__
+    return wrapper
+
+def main(argv=None):
+    #the static hedge scenario analysis: sweep of integer hedge weights, the continuous optimum and
+    #the grid, payoff and value of one hedged basket written out through export
+    import export
+    parser = argparse.ArgumentParser(description="Static hedge of a binary with two calls under uncertain volatility")
+    parser.add_argument("--binary-strike", type=float, default=100)
+    parser.add_argument("--low-strike", type=float, default=90)
+    parser.add_argument("--high-strike", type=float, default=110)
+    parser.add_argument("--vol-high", type=float, default=.3, help="Vol_H")
+    parser.add_argument("--vol-low", type=float, default=.2, help="Vol_L")
+    parser.add_argument("--market-vol", type=float, default=.25, help="implied vol the call legs trade at")
+    parser.add_argument("--rate", type=float, default=.05)
+    parser.add_argument("--expiration", type=float, default=.5)
+    parser.add_argument("--spot", type=float, default=100)
+    parser.add_argument("--nas", type=int, default=200, help="number of asset grid nodes")
+    parser.add_argument("--method", choices=["explicit", "implicit", "cn"], default="explicit")
+    parser.add_argument("--output", default="output.csv", help="grid, payoff and value of the hedged basket, .npz or .csv")
+    args = parser.parse_args(argv)
+
+    Vol_H, Vol_L, r, T, NAS = args.vol_high, args.vol_low, args.rate, args.expiration, args.nas
+    bStrike, lowStrike, highStrike, spot = args.binary_strike, args.low_strike, args.high_strike, args.spot
+
+    lowerOption = BlackScholes(spot, lowStrike, T, r, args.market_vol)
+    higherOption = BlackScholes(spot, highStrike, T, r, args.market_vol)
+
+    minimum = [100, 100, 100]
+    weights1 = [i/100.0 for i in range(-10, 10) for j in range(-10, 10)]
+    weights2 = [j/100.0 for i in range(-10, 10) for j in range(-10, 10)]
+    batch = basketBatch(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, T, NAS, weights1, weights2, -1, args.method)
+    for i in range(-10, 10): #-10, 0
+        for j in range(-10, 10): #1, 10
+            k = (i + 10) * 20 + (j + 10)
+            baskets = [batch[0], batch[1][k], batch[2][k]]
+            spotValue = findValue(baskets, spot)
+            if(abs(minimum[2]) > abs(spotValue)): #and findValue(baskets, 80) < .001):
+                minimum[0] = i
+                minimum[1] = j
+                minimum[2] = spotValue
+    maximum = hedgeWeights(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, T, NAS, -1, lowerOption, higherOption, spot, method=args.method)
+
+    print("MIN: Lambda1 = " + str(minimum[0]) + " Lambda2: " + str(minimum[1]) + " Value: " + str(minimum[2]) )
+    print("MAX: Lambda1 = " + str(maximum[0] * 100) + " Lambda2: " + str(maximum[1] * 100) + " Value: " + str(maximum[2]))
+    print("Backed binary: " + str(minimum[2] - minimum[0]/100.0*lowerOption - minimum[1]/100.0*higherOption))
+
+    what2 = basket(Vol_H, Vol_L, r, bStrike, lowStrike, highStrike, T, NAS, -.05, .05, 1, args.method)
+    print("backed binary: " + str(findValue(what2, spot) + .05* lowerOption - .05*higherOption))
+    params = {"Vol_H": Vol_H, "Vol_L": Vol_L, "r": r, "Expiration": T, "weight1": -.05, "weight2": .05, "binaryPos": 1}
+    export.write(args.output, what2, params)
+
+if __name__ == "__main__":
+    main()